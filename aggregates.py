@@ -0,0 +1,117 @@
+"""
+Fleet rollups computed once per data version.
+
+FleetAggregates first reduces the snapshot's device rows to a small cube
+grouped by (vessel, device, status, install month), holding row counts and
+savings sums. The unfiltered rollups per vessel, device, status and month
+are materialised from that cube up front. Filtered rollups (vessel name
+prefix, device, status) re-aggregate the cube, which has at most one row per
+vessel/device pair, instead of going back to list_df.
+
+Savings are reported separately as dollars (fuel and maintenance, plus their
+sum) and CO2 tons, never added together.
+"""
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ('vessel', 'device', 'status', 'month')
+MEASURES = ('fuel_savings', 'maintenance_savings', 'co2_savings')
+
+# Installation Status values that count towards completion
+DONE = 'Done'
+IN_PROCESS = 'In Process'
+NO_NEED = 'No Need'
+
+
+def parse_filter(values):
+    """None, a comma separated string or a list of them -> list of stripped values."""
+    if values is None:
+        return []
+    if isinstance(values, str):
+        values = [values]
+    return [v.strip() for value in values for v in str(value).split(',') if v.strip()]
+
+
+class FleetAggregates:
+    def __init__(self, devices):
+        frame = pd.DataFrame({
+            'vessel': devices['vessel'].astype(object),
+            'device': devices['device'].astype(object),
+            'status': devices['status'].astype(object),
+            'month': devices['installed_at'].dt.strftime('%Y-%m'),
+        })
+        for measure in MEASURES:
+            frame[measure] = devices[measure].fillna(0).to_numpy()
+        frame['rows'] = 1
+        self.cube = frame.groupby(list(DIMENSIONS), dropna=False, sort=False).sum().reset_index()
+        self._rollups = {dimension: self._rollup(self.cube, dimension) for dimension in DIMENSIONS}
+        self._fleet = self._totals(self.cube)
+
+    def filter(self, vessel=None, device=None, status=None):
+        """Cube rows matching vessel name prefixes, device names and statuses (any of each)."""
+        cube = self.cube
+        mask = np.ones(len(cube), dtype=bool)
+        prefixes = tuple(p.lower() for p in parse_filter(vessel))
+        if prefixes:
+            mask &= cube['vessel'].astype(str).str.lower().str.startswith(prefixes).to_numpy()
+        devices = parse_filter(device)
+        if devices:
+            mask &= cube['device'].isin(devices).to_numpy()
+        statuses = parse_filter(status)
+        if statuses:
+            mask &= cube['status'].isin(statuses).to_numpy()
+        return cube[mask]
+
+    def rollup(self, dimension, vessel=None, device=None, status=None):
+        """DataFrame of totals per value of dimension, optionally filtered."""
+        if dimension not in DIMENSIONS:
+            raise KeyError(dimension)
+        if not (parse_filter(vessel) or parse_filter(device) or parse_filter(status)):
+            return self._rollups[dimension]
+        return self._rollup(self.filter(vessel, device, status), dimension)
+
+    def fleet(self, vessel=None, device=None, status=None):
+        """Totals over the whole (optionally filtered) fleet, as a dict."""
+        if not (parse_filter(vessel) or parse_filter(device) or parse_filter(status)):
+            return self._fleet
+        return self._totals(self.filter(vessel, device, status))
+
+    @staticmethod
+    def _with_counts(cube):
+        rows = cube['rows']
+        return cube.assign(
+            done=rows.where(cube['status'] == DONE, 0),
+            in_process=rows.where(cube['status'] == IN_PROCESS, 0),
+            no_need=rows.where(cube['status'] == NO_NEED, 0),
+        )
+
+    @staticmethod
+    def _ratios(table):
+        table['needed'] = table['rows'] - table['no_need']
+        needed = table['needed'].where(table['needed'] > 0)
+        table['completion'] = (table['done'] + table['in_process']) / needed
+        table['done_ratio'] = table['done'] / needed
+        table['total_savings'] = table['fuel_savings'] + table['maintenance_savings']
+        return table
+
+    def _rollup(self, cube, dimension):
+        columns = ['rows', 'done', 'in_process', 'no_need', *MEASURES]
+        table = self._with_counts(cube).groupby(dimension, dropna=False, sort=False)[columns].sum()
+        table = self._ratios(table).reset_index()
+        if dimension == 'month':
+            return table.sort_values('month', na_position='last', ignore_index=True)
+        if dimension == 'status':
+            return table.sort_values('rows', ascending=False, ignore_index=True)
+        return table.sort_values('total_savings', ascending=False, ignore_index=True)
+
+    def _totals(self, cube):
+        columns = ['rows', 'done', 'in_process', 'no_need', *MEASURES]
+        table = self._ratios(self._with_counts(cube)[columns].sum().to_frame().T.astype({c: 'int64' for c in columns[:4]}))
+        return records(table)[0]
+
+
+def records(table):
+    """JSON-ready list of dicts: NaN becomes None and numpy scalars plain Python."""
+    table = table.astype(object).where(table.notna(), None)
+    return [{k: (v.item() if isinstance(v, np.generic) else v) for k, v in row.items()} for row in table.to_dict('records')]
@@ -19,108 +19,887 @@ HOW TO DEPLOY
 
 # ----- Begin original app with PWA additions -----
 
+import hashlib
+import contextlib
+import html as html_lib
+import hmac
+import datetime
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import unquote
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from flask import Flask, render_template_string, request
+from flask import Flask, Response, g, has_request_context, request, send_file, url_for
+from markupsafe import Markup, escape
+from werkzeug.local import LocalProxy
+
+from aggregates import DIMENSIONS, parse_filter, records
+from assets import AssetManifest, Encoded
+from cache import LRUCache
+from charts import CHARTS, ChartRenderer
+from datasets import ENVIRON_KEY as DATASET_KEY, DatasetPrefix, DatasetRegistry, configured_paths
+from export import FORMATS as EXPORT_FORMATS, STREAMS as EXPORT_STREAMS, ExportError, parse_columns, parse_date, select as select_export_rows
+from images import ImagePipeline
+from indexes import device_positions
+from journal import STATUS_CHOICES, apply_edits, locate_device_row
+from metrics import Phases, Registry, peak_resident_memory, resident_memory
+from search import KINDS as SEARCH_KINDS
+from sync import TrackerSync, data_version, tracker_rows
+from timeline import DIMENSIONS as TIMELINE_DIMENSIONS, FREQUENCIES as TIMELINE_FREQUENCIES, TimelineError
+from writeback import flush
 
 # Create a Flask app
 app = Flask(__name__)
 
 
-# Load the Excel file with specified column names starting from row 8 and column B
-file_path = 'Vessel_Device_Installation_Tracker NV.xlsx'
-column_names = ['Vessel Name/ ID', 'Spec', 'Devices', 'Installation Status', 'Date of Installation', 'Savings/year (fuel efficiency)', 'Savings/year (Maitenance)', 'Co2 savings ton/year']
-df = pd.read_excel(file_path, engine='openpyxl', names=column_names, skiprows=7, usecols="B:I")
+# Load every table from the Excel file in one pass (see loader.py). Later boots
+# with an unchanged workbook are served from the snapshot cache instead.
+# The tables and their lookup indexes live in a DataSnapshot (see snapshot.py)
+# that is swapped atomically when the workbook changes on disk.
+# SUSTAINABOS_WORKBOOK points the app at another workbook (see bench/).
+file_path = os.environ.get('SUSTAINABOS_WORKBOOK', 'Vessel_Device_Installation_Tracker NV.xlsx')
 
-list_df = pd.read_excel(file_path, engine='openpyxl', sheet_name='Tracker', skiprows=6, nrows=418, usecols="B:J")
-
-# Load the summary sheet
-summary_df = pd.read_excel(file_path, engine='openpyxl', sheet_name='Summary', skiprows=0,  nrows=13, usecols="A:F")
-summary2_df = pd.read_excel(file_path, engine='openpyxl', sheet_name='Summary', skiprows=15,  nrows=3, usecols="B:C")
-summary3_df = pd.read_excel(file_path, engine='openpyxl', sheet_name='Summary', skiprows=0,  nrows=4, usecols="I:K")
-listvessel_df = pd.read_excel(file_path, engine='openpyxl', sheet_name='Summary', skiprows=21,  nrows=70, usecols="A")
-listdevice_df = pd.read_excel(file_path, engine='openpyxl', sheet_name='Summary', skiprows=1,  nrows=12, usecols="A")
+# More workbooks are served under /d/<dataset>/, each loaded on first use and
+# evicted again when the loaded ones outgrow their limits (see datasets.py).
+# store, journal and write_behind are those of the request's dataset, and of
+# the default one (file_path) outside requests.
+datasets = DatasetRegistry(configured_paths(file_path))
+app.wsgi_app = DatasetPrefix(app.wsgi_app)
+
+
+def current_dataset():
+    return datasets.get(request.environ.get(DATASET_KEY) if has_request_context() else None)
+
+store = LocalProxy(lambda: datasets.store(current_dataset().id))
+
+# Installation statuses shown by /get_device_summary unless the caller asks otherwise
+DEFAULT_DEVICE_STATUSES = ("Done", "In Process")
+
+ADMIN_TOKEN = os.environ.get('SUSTAINABOS_ADMIN_TOKEN')
+
+
+def token_matches(expected, supplied):
+    # Constant-time comparison; nothing matches a token that isn't configured
+    if not expected or not isinstance(supplied, str):
+        return False
+    return hmac.compare_digest(expected.encode('utf-8'), supplied.encode('utf-8'))
+
+# Rendered vessel/device tables, keyed by snapshot version. Set
+# SUSTAINABOS_WARM_FRAGMENTS=1 to pre-render all of them after every load.
+fragment_cache = LRUCache(
+    max_entries=int(os.environ.get('SUSTAINABOS_FRAGMENT_CACHE_ENTRIES', '1024')),
+    max_size=int(os.environ.get('SUSTAINABOS_FRAGMENT_CACHE_SIZE', str(8 * 1024 * 1024))),
+)
+WARM_FRAGMENTS = os.environ.get('SUSTAINABOS_WARM_FRAGMENTS') == '1'
+
+
+# Files under static/ are served under content-hashed names with immutable
+# caching, compressible ones precompressed (see assets.py).
+assets = AssetManifest(app.static_folder)
+PRECACHE_MAX_SIZE = int(os.environ.get('SUSTAINABOS_PRECACHE_MAX_SIZE', str(256 * 1024)))
+
+
+@app.url_defaults
+def fingerprint_static(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = assets.url_name(values['filename'])
+
+
+def static_asset(filename):
+    asset, fingerprinted = assets.resolve(filename)
+    if asset is None:
+        return {'error': 'Not found.'}, 404
+    encoding, path = assets.variant(asset, request.accept_encodings)
+    response = send_file(path, mimetype=asset.mimetype, max_age=31536000 if fingerprinted else None, conditional=True, etag=True)
+    if asset.compressible:
+        response.vary.add('Accept-Encoding')
+    if encoding:
+        response.content_encoding = encoding
+    if fingerprinted:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+app.view_functions['static'] = static_asset
+
+
+def send_encoded(encoded, mimetype, etag=None):
+    """Response for an Encoded body in the best encoding the client takes, with 304 support."""
+    encoding, data = encoded.select(request.accept_encodings)
+    response = Response(data, mimetype=mimetype)
+    if encoded.encodings:
+        response.vary.add('Accept-Encoding')
+    if encoding:
+        response.content_encoding = encoding
+    etag = etag or encoded.etag
+    response.set_etag(f'{etag}-{encoding}' if encoding else etag)
+    return response.make_conditional(request)
+
+
+# Status edits: journalled in SQLite, applied to this worker's snapshot at once
+# and written back to the workbook in batches (see journal.py / writeback.py).
+# Editing is disabled unless SUSTAINABOS_EDIT_TOKEN is set.
+EDIT_TOKEN = os.environ.get('SUSTAINABOS_EDIT_TOKEN')
+EDIT_SYNC_INTERVAL = float(os.environ.get('SUSTAINABOS_EDIT_SYNC_INTERVAL', '1'))
+journal = LocalProxy(lambda: current_dataset().journal)
+write_behind = LocalProxy(lambda: current_dataset().write_behind)
+
+
+@datasets.add_overlay
+def apply_unflushed_edits(dataset, snap):
+    # Edits journalled after this workbook was written are layered on top of it
+    snap.edit_id = dataset.journal.flushed_through(snap.source_hash)
+    return apply_edits(snap, dataset.journal.edits_since(snap.edit_id))
+
+# Loaded at import so the first request doesn't pay for it; loader.load_tables logs the timings
+load_info = store.current().info
+
+
+def sync_edits():
+    # Pick up edits made through other workers, at most once per EDIT_SYNC_INTERVAL
+    dataset = current_dataset()
+    now = time.monotonic()
+    if now - dataset.last_edit_sync < EDIT_SYNC_INTERVAL:
+        return
+    dataset.last_edit_sync = now
+    if journal.last_id() > store.current().edit_id:
+        store.update(lambda snap: apply_edits(snap, journal.edits_since(snap.edit_id)))
+
+
+# Request instrumentation (see metrics.py). Each request's phases go out in a
+# Server-Timing header (SUSTAINABOS_SERVER_TIMING=0 leaves it off) and into
+# the histograms served by /metrics.
+SERVER_TIMING = os.environ.get('SUSTAINABOS_SERVER_TIMING', '1') != '0'
+METRICS_TOKEN = os.environ.get('SUSTAINABOS_METRICS_TOKEN')
+registry = Registry()
+request_count = registry.counter('sustainabos_requests_total', 'HTTP requests handled.', ('method', 'endpoint', 'status'))
+request_latency = registry.histogram('sustainabos_request_duration_seconds', 'Time to handle a request.', ('endpoint',))
+phase_latency = registry.histogram('sustainabos_phase_duration_seconds', 'Time spent in each phase of a request.', ('endpoint', 'phase'))
+snapshot_swaps = registry.counter('sustainabos_snapshot_swaps_total', 'Data snapshots swapped in (workbook loads and status edits).')
+load_latency = registry.histogram('sustainabos_workbook_load_seconds', 'Time to load the workbook tables, by source.', ('source',),
+                                  buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+_last_load_timings = load_info['timings']
+load_latency.observe(load_info['timings']['total'], load_info['source'])
+
+
+@datasets.on_load
+def record_snapshot(snap):
+    # Edits swap in snapshots that share their load's info, only count real loads
+    global _last_load_timings
+    snapshot_swaps.inc()
+    timings = snap.info.get('timings')
+    if timings is not None and timings is not _last_load_timings:
+        _last_load_timings = timings
+        load_latency.observe(timings['total'], snap.info['source'])
+
+
+def phase(name):
+    # Times a step of the current request; a no-op outside requests (warm-up threads)
+    phases = g.get('phases') if has_request_context() else None
+    return phases.phase(name) if phases is not None else contextlib.nullcontext()
+
+
+def cached(cache, name, key, render):
+    # cache.get_or_render that reports the hit or miss in Server-Timing
+    missed = []
+
+    def render_miss():
+        missed.append(True)
+        return render()
+    value = cache.get_or_render(key, render_miss)
+    if has_request_context() and 'phases' in g:
+        g.phases.note(f'{name}-cache', 'miss' if missed else 'hit')
+    return value
+
+
+@app.before_request
+def start_phases():
+    g.phases = Phases()
+
+
+@app.after_request
+def record_phases(response):
+    phases = g.pop('phases', None)
+    if phases is None:
+        return response
+    total = phases.elapsed()
+    endpoint = request.endpoint or 'unmatched'
+    request_count.inc(request.method, endpoint, str(response.status_code))
+    request_latency.observe(total, endpoint)
+    for name, seconds in phases.durations.items():
+        phase_latency.observe(seconds, endpoint, name)
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = phases.server_timing(total)
+    return response
+
+
+@app.before_request
+def check_dataset():
+    dataset_id = request.environ.get(DATASET_KEY)
+    if dataset_id is not None and dataset_id not in datasets:
+        return {'error': 'Unknown dataset.'}, 404
+
+
+@app.before_request
+def start_snapshot_watcher():
+    # Started lazily so every gunicorn worker (forked or not) polls on its own
+    store.ensure_watcher()
+    write_behind.ensure_started()
+    with phase('data'):
+        sync_edits()
 
 # Utility functions
 
-def get_vessel_summary(vessel_name):
-    if list_df.empty:
-        return None
-    start_idx = list_df[list_df.iloc[:, 1] == vessel_name].index
-    if len(start_idx) == 0:
+class InvalidRequest(ValueError):
+    """Malformed request parameters, answered with a 400 and the message."""
+
+
+@app.errorhandler(InvalidRequest)
+def invalid_request(e):
+    return {'error': str(e)}, 400
+
+
+def _json_payload():
+    # The JSON object sent with the request, None when there is no JSON body
+    payload = request.get_json(silent=True)
+    if payload is not None and not isinstance(payload, dict):
+        raise InvalidRequest('The JSON body must be an object.')
+    return payload
+
+
+def _requested_name(key):
+    # A single vessel or device name from the JSON payload or the form
+    payload = _json_payload()
+    name = payload.get(key) if payload else request.form.get(key)
+    if name is not None and not isinstance(name, str):
+        raise InvalidRequest(f'{key} must be a string.')
+    return name
+
+
+# Table headers of the vessel and device summaries
+VESSEL_SUMMARY_COLUMNS = [
+    'N','Vessel Name/ ID','Spec','Devices','Installation Status','Date of Installation','Savings/year (fuel efficiency)','Savings/year (Maitenance)','Co2 savings ton/year'
+]
+DEVICE_SUMMARY_COLUMNS = [
+    'Vessel Name','Devices','Installation Status','Date of Installation','Savings/year (fuel efficiency)','Savings/year (Maitenance)','Co2 savings ton/year'
+]
+
+def get_vessel_summary(vessel_name, snap=None):
+    # Rows of the vessel's block in list_df (treat as read-only), or None
+    snap = snap or store.current()
+    with phase('lookup'):
+        span = snap.vessel_index.get(vessel_name)
+        if span is None:
+            return None
+        start, end = span
+        return snap.list_df.iloc[start:end]
+
+def render_vessel_fragment(vessel_name, snap):
+    summaryBIS_df = get_vessel_summary(vessel_name, snap)
+    if summaryBIS_df is None:
         return None
-    start = start_idx[0]
-    end = start + 1
-    while end < len(list_df) and pd.isna(list_df.iloc[end, 0]):
-        end += 1
-    summaryBIS_df = list_df.iloc[start:end].copy()
-    return summaryBIS_df
+    with phase('serialize'):
+        return Encoded(vessel_table_html(summaryBIS_df))
+
+def display_frame(df):
+    # The typed list_df columns back to the cell values the tables have always
+    # shown: blanks for missing values and whole numbers without a decimal point
+    shown = {}
+    for i in range(df.shape[1]):
+        values = df.iloc[:, i]
+        cells = values.to_numpy(dtype=object)
+        if values.dtype.kind == 'f':
+            cells = np.array([int(v) if v == v and v.is_integer() else v for v in cells], dtype=object)
+        cells[values.isna().to_numpy()] = ''
+        shown[i] = cells
+    shown = pd.DataFrame(shown, index=df.index)
+    shown.columns = df.columns
+    return shown
+
+def vessel_table_html(summaryBIS_df):
+    summaryBIS_df = display_frame(summaryBIS_df)
+    summaryBIS_df.columns = VESSEL_SUMMARY_COLUMNS
+    return summaryBIS_df.to_html(index=False, classes='table table-bordered table-striped', border=0)
 
 @app.route('/get_vessel_summary', methods=['POST'])
 def get_vessel_summary_route():
-    vessel_name = request.json.get('vesselName') if request.json else request.form.get('vesselName')
-    summaryBIS_df = get_vessel_summary(vessel_name)
-    if summaryBIS_df is None:
+    vessel_name = _requested_name('vesselName')
+    snap = store.current()
+    html = cached(fragment_cache, 'fragment', (snap.version, 'vessel', vessel_name), lambda: render_vessel_fragment(vessel_name, snap))
+    if html is None:
         return {'error': 'Vessel not found or data not loaded.'}, 404
-    summaryBIS_df = summaryBIS_df.fillna('')
-    column_names2 = [
-        'N','Vessel Name/ ID','Spec','Devices','Installation Status','Date of Installation','Savings/year (fuel efficiency)','Savings/year (Maitenance)','Co2 savings ton/year'
-    ]
-    summaryBIS_df.columns = column_names2
-    return summaryBIS_df.to_html(index=False, classes='table table-bordered table-striped', border=0)
+    return send_encoded(html, 'text/html')
+
+
+def get_device_summary(device_name, statuses=DEFAULT_DEVICE_STATUSES, snap=None):
+    # statuses=None returns the device's rows whatever their status
+    snap = snap or store.current()
+    with phase('lookup'):
+        positions = device_positions(snap.device_index, device_name, statuses)
+        if len(positions) == 0:
+            return pd.DataFrame()
+        filtered_df = snap.list_df.iloc[positions, 3:9].copy()
+        filtered_df.insert(0, "Vessel Name", snap.vessel_owner[positions])
+        return filtered_df
+
+
+def _requested_statuses():
+    # "status" may be a list or a comma separated string; "all" disables the filter
+    payload = _json_payload()
+    if payload:
+        statuses = payload.get('status')
+    else:
+        statuses = request.values.getlist('status') or None
+    if statuses is None:
+        return DEFAULT_DEVICE_STATUSES
+    if isinstance(statuses, str):
+        statuses = statuses.split(',')
+    if not isinstance(statuses, list) or not all(isinstance(s, str) for s in statuses):
+        raise InvalidRequest('status must be a string or a list of strings.')
+    statuses = [s.strip() for s in statuses if s and s.strip()]
+    if not statuses:
+        return DEFAULT_DEVICE_STATUSES
+    if any(s.lower() == 'all' for s in statuses):
+        return None
+    return statuses
 
+def render_device_fragment(device_name, statuses, snap):
+    filtered_df = get_device_summary(device_name, statuses, snap)
+    if filtered_df.empty:
+        return None
+    with phase('serialize'):
+        return Encoded(device_table_html(filtered_df))
 
-def get_device_summary(device_name):
-    if list_df.empty:
-        return pd.DataFrame()
-    filtered_df = list_df[(list_df.iloc[:, 3] == device_name) & (list_df.iloc[:, 4].isin(["Done", "In Process"]))].copy()
-    vessel_names = []
-    for idx in filtered_df.index:
-        vessel_name = None
-        search_idx = idx
-        while search_idx >= 0:
-            val = list_df.iloc[search_idx, 1]
-            if pd.notna(val):
-                vessel_name = val
-                break
-            search_idx -= 1
-        vessel_names.append(vessel_name)
-    filtered_df.insert(0, "Vessel Name", vessel_names)
-    cols = ["Vessel Name"] + list(filtered_df.columns[4:10])
-    return filtered_df[cols]
+def device_table_html(filtered_df):
+    filtered_df = display_frame(filtered_df)
+    filtered_df.columns = DEVICE_SUMMARY_COLUMNS
+    return filtered_df.to_html(index=False, classes='table table-bordered table-striped', border=0)
 
 @app.route('/get_device_summary', methods=['POST'])
 def get_device_summary_route():
-    device_name = request.json.get('deviceName') if request.json else request.form.get('deviceName')
-    filtered_df = get_device_summary(device_name)
-    if filtered_df.empty:
+    device_name = _requested_name('deviceName')
+    statuses = _requested_statuses()
+    statuses = tuple(statuses) if statuses is not None else None
+    snap = store.current()
+    html = cached(fragment_cache, 'fragment', (snap.version, 'device', device_name, statuses), lambda: render_device_fragment(device_name, statuses, snap))
+    if html is None:
         return {'error': 'No data or device not found.'}, 404
-    filtered_df = filtered_df.fillna('').infer_objects(copy=False)
-    column_names3 = [
-        'Vessel Name','Devices','Installation Status','Date of Installation','Savings/year (fuel efficiency)','Savings/year (Maitenance)','Co2 savings ton/year'
-    ]
-    filtered_df.columns = column_names3
-    return filtered_df.to_html(index=False, classes='table table-bordered table-striped', border=0)
-
-# Generate a simple top vessels chart if data exists
-if not df.empty:
+    return send_encoded(html, 'text/html')
+
+
+def send_fragment(html, snap, version=None):
+    # ?v=<data version> URLs are content-addressed, so the browser and the
+    # service worker may keep them; anything else must be revalidated
+    response = send_encoded(html, 'text/html')
+    if request.args.get('v') == (version or data_version(snap)):
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+@app.route('/api/vessel_summary')
+def vessel_summary_lookup():
+    # Cacheable GET version of /get_vessel_summary: ?name=<vessel>&v=<data version>
+    vessel_name = request.args.get('name')
+    snap = store.current()
+    html = cached(fragment_cache, 'fragment', (snap.version, 'vessel', vessel_name), lambda: render_vessel_fragment(vessel_name, snap))
+    if html is None:
+        return {'error': 'Vessel not found or data not loaded.'}, 404
+    return send_fragment(html, snap)
+
+
+@app.route('/api/device_summary')
+def device_summary_lookup():
+    # Cacheable GET version of /get_device_summary: ?name=<device>&status=...&v=<data version>
+    device_name = request.args.get('name')
+    statuses = _requested_statuses()
+    statuses = tuple(statuses) if statuses is not None else None
+    snap = store.current()
+    html = cached(fragment_cache, 'fragment', (snap.version, 'device', device_name, statuses), lambda: render_device_fragment(device_name, statuses, snap))
+    if html is None:
+        return {'error': 'No data or device not found.'}, 404
+    return send_fragment(html, snap)
+
+
+# Typeahead over vessel names, device names and specs (see search.py)
+SEARCH_PAGE_SIZE = 10
+SEARCH_MAX_PAGE_SIZE = 50
+
+
+@app.route('/search')
+def search():
+    # ?q=<text>&kind=vessel,device,spec&page=1&per_page=10[&v=<data version>]
+    query = (request.args.get('q') or '').strip()[:100]
+    kinds = [kind for kind in parse_filter(request.args.getlist('kind')) if kind in SEARCH_KINDS] or None
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', SEARCH_PAGE_SIZE, type=int), 1), SEARCH_MAX_PAGE_SIZE)
+    snap = store.current()
+    with phase('lookup'):
+        results = snap.search_index.search(query, kinds)
+    start = (page - 1) * per_page
+    body = {
+        'query': query,
+        'version': data_version(snap),
+        'total': len(results),
+        'page': page,
+        'per_page': per_page,
+        'results': [dict(entry, score=score) for score, entry in results[start:start + per_page]],
+    }
+    with phase('serialize'):
+        # Built for this request only: not worth the full compression levels
+        encoded = Encoded(json.dumps(body, separators=(',', ':')), fast=True)
+    response = send_encoded(encoded, 'application/json')
+    if request.args.get('v') == data_version(snap):
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+# Several vessel and device summaries in one round trip
+MAX_BATCH_ITEMS = int(os.environ.get('SUSTAINABOS_MAX_BATCH_ITEMS', '100'))
+
+
+def _take_groups(list_df, groups, columns):
+    # One iloc over the rows of every group, split back into {name: rows}
+    if not groups:
+        return {}
+    positions = np.concatenate([positions for _, positions in groups])
+    block = list_df.iloc[positions, columns]
+    result = {}
+    offset = 0
+    for name, positions in groups:
+        result[name] = block.iloc[offset:offset + len(positions)]
+        offset += len(positions)
+    return result
+
+
+def batch_summaries(vessel_names, device_names, statuses, snap):
+    """
+    ({vessel: rows or None}, {device: rows or None}) for the same rows as
+    get_vessel_summary / get_device_summary, in a single pass over list_df.
+    """
+    with phase('lookup'):
+        vessel_groups = [(name, np.arange(*snap.vessel_index[name])) for name in vessel_names if name in snap.vessel_index]
+        vessels = _take_groups(snap.list_df, vessel_groups, slice(None))
+
+        device_groups = [(name, device_positions(snap.device_index, name, statuses)) for name in device_names]
+        device_groups = [(name, positions) for name, positions in device_groups if len(positions)]
+        devices = _take_groups(snap.list_df, device_groups, slice(3, 9))
+        for name, positions in device_groups:
+            devices[name] = devices[name].copy()
+            devices[name].insert(0, "Vessel Name", snap.vessel_owner[positions])
+
+    return ({name: vessels.get(name) for name in vessel_names}, {name: devices.get(name) for name in device_names})
+
+
+def render_batch(vessels, devices, fmt):
+    with phase('serialize'):
+        return _render_batch(vessels, devices, fmt)
+
+
+def _render_batch(vessels, devices, fmt):
+    not_found = {'vessel': 'Vessel not found.', 'device': 'No data or device not found.'}
+    items = [('vessel', name, rows) for name, rows in vessels.items()] + [('device', name, rows) for name, rows in devices.items()]
+    if fmt == 'html':
+        parts = []
+        for kind, name, rows in items:
+            parts.append(f'<h4>{escape(name)}</h4>')
+            if rows is None:
+                parts.append(f'<p class="not-found">{not_found[kind]}</p>')
+            else:
+                parts.append(vessel_table_html(rows) if kind == 'vessel' else device_table_html(rows))
+        return Encoded('\n'.join(parts))
+    result = {'vessels': [], 'devices': []}
+    for kind, name, rows in items:
+        if rows is None:
+            item = {'name': name, 'found': False, 'error': not_found[kind]}
+        else:
+            columns = VESSEL_SUMMARY_COLUMNS if kind == 'vessel' else DEVICE_SUMMARY_COLUMNS
+            item = {'name': name, 'found': True, 'columns': columns, 'rows': tracker_rows(rows)}
+        result[kind + 's'].append(item)
+    return Encoded(json.dumps(result, separators=(',', ':')))
+
+
+def _requested_names(key):
+    # JSON list (or single string) in the payload, else repeated query/form values
+    payload = _json_payload()
+    if payload:
+        names = payload.get(key) or []
+        names = [names] if isinstance(names, str) else names
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise InvalidRequest(f'{key} must be a string or a list of strings.')
+    else:
+        names = request.values.getlist(key)
+    # Keep the first occurrence of each name, in request order
+    return list(dict.fromkeys(name for name in names if name))
+
+
+@app.route('/api/summaries', methods=['GET', 'POST'])
+def batch_summary_route():
+    # vessels=[...]&devices=[...]&status=...&format=json|html; unknown names are
+    # reported per item instead of failing the batch
+    vessel_names = _requested_names('vessels')
+    device_names = _requested_names('devices')
+    if not vessel_names and not device_names:
+        return {'error': 'Give at least one vessel or device name.'}, 400
+    if len(vessel_names) + len(device_names) > MAX_BATCH_ITEMS:
+        return {'error': f'At most {MAX_BATCH_ITEMS} names per request.'}, 400
+    payload = _json_payload() or {}
+    fmt = payload.get('format') or request.values.get('format') or 'json'
+    if fmt not in ('json', 'html'):
+        return {'error': 'format must be json or html.'}, 400
+    statuses = _requested_statuses()
+    statuses = tuple(statuses) if statuses is not None else None
+    snap = store.current()
+    key = (snap.version, 'batch', tuple(vessel_names), tuple(device_names), statuses, fmt)
+    body = cached(fragment_cache, 'fragment', key, lambda: render_batch(*batch_summaries(vessel_names, device_names, statuses, snap), fmt))
+    response = send_encoded(body, 'text/html' if fmt == 'html' else 'application/json')
+    response.cache_control.no_cache = True
+    return response
+
+
+# The whole tracker as JSON for the service worker's offline copy (see sync.py).
+# ?since=<version> returns only the rows changed since that version.
+tracker_sync = TrackerSync(VESSEL_SUMMARY_COLUMNS, DEVICE_SUMMARY_COLUMNS)
+tracker_cache = LRUCache(max_entries=64, max_size=16 * 1024 * 1024)
+datasets.on_load(lambda snap: tracker_cache.clear())
+
+
+def render_tracker(snap, since):
+    with phase('serialize'):
+        return Encoded(json.dumps(tracker_sync.delta(snap, since), separators=(',', ':')))
+
+
+@app.route('/api/tracker')
+def tracker_data():
+    since = request.args.get('since') or None
+    snap = store.current()
+    body = cached(tracker_cache, 'tracker', (snap.version, since), lambda: render_tracker(snap, since))
+    response = send_encoded(body, 'application/json')
+    response.cache_control.no_cache = True
+    return response
+
+
+def warm_fragments(snap):
+    # Pre-render every vessel and device offered in the dropdowns, stopping early
+    # if a newer snapshot has been swapped in (or the dataset evicted) meanwhile
+    vessels = snap.listvessel_df.iloc[:, 0].dropna() if not snap.listvessel_df.empty else []
+    devices = snap.listdevice_df.iloc[:, 0].dropna() if not snap.listdevice_df.empty else []
+    for vessel_name in vessels:
+        if not datasets.is_current(snap):
+            return
+        fragment_cache.get_or_render((snap.version, 'vessel', vessel_name), lambda: render_vessel_fragment(vessel_name, snap))
+    for device_name in devices:
+        if not datasets.is_current(snap):
+            return
+        fragment_cache.get_or_render((snap.version, 'device', device_name, DEFAULT_DEVICE_STATUSES), lambda: render_device_fragment(device_name, DEFAULT_DEVICE_STATUSES, snap))
+
+
+@datasets.on_load
+def reset_fragment_cache(snap):
+    fragment_cache.clear()
+    if WARM_FRAGMENTS:
+        threading.Thread(target=warm_fragments, args=(snap,), name='fragment-warmup', daemon=True).start()
+
+if WARM_FRAGMENTS:
+    threading.Thread(target=warm_fragments, args=(store.current(),), name='fragment-warmup', daemon=True).start()
+
+
+@app.route('/update_status', methods=['POST'])
+def update_status_route():
+    payload = _json_payload() or request.form
+    token = request.headers.get('X-Edit-Token') or payload.get('token')
+    if not token_matches(EDIT_TOKEN, token):
+        return {'error': 'Status editing is not allowed.'}, 403
+    fields = {key: payload.get(key) for key in ('vesselName', 'deviceName', 'status', 'installationDate')}
+    wrong = [key for key, value in fields.items() if value is not None and not isinstance(value, str)]
+    if wrong:
+        return {'error': ', '.join(wrong) + ' must be text.'}, 400
+    vessel_name = fields['vesselName']
+    device_name = fields['deviceName']
+    status = fields['status']
+    installed = (fields['installationDate'] or '').strip()[:32] or None
+    if status not in STATUS_CHOICES:
+        return {'error': 'Status must be one of: ' + ', '.join(STATUS_CHOICES)}, 400
+    if locate_device_row(store.current(), vessel_name, device_name) is None:
+        return {'error': 'Vessel or device not found.'}, 404
+    edit = journal.append(vessel_name, device_name, status, installed)
+    snap = store.update(lambda snap: apply_edits(snap, journal.edits_since(snap.edit_id, until=edit['id'])))
+    return {'status': 'ok', 'edit': edit, 'version': snap.version, 'data_version': data_version(snap)}
+
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    # Reloads this worker in the background; the other workers pick the change up
+    # from their own watcher. Disabled unless SUSTAINABOS_ADMIN_TOKEN is set.
+    if not token_matches(ADMIN_TOKEN, request.headers.get('X-Admin-Token')):
+        return {'error': 'Forbidden'}, 403
+    snap = store.current()
+    store.reload_async(force=request.args.get('force') == '1')
+    return {'status': 'reloading', 'version': snap.version, 'hash': snap.hash, 'loaded_at': snap.loaded_at}, 202
+
+
+# Charts are drawn on first request for each data version (see charts.py)
+chart_renderer = ChartRenderer()
+datasets.on_load(chart_renderer.refresh)
+CHART_TIMEOUT = float(os.environ.get('SUSTAINABOS_CHART_TIMEOUT', '30'))
+
+@app.route('/charts/<name>')
+def chart(name):
+    # With ?v=<current data version> the URL is content-addressed and cached for a year
+    name = name.removesuffix('.png')
+    if name not in CHARTS:
+        return {'error': 'Unknown chart.'}, 404
+    snap = store.current()
+    immutable = request.args.get('v') == snap.hash[:16]
+    for attempt in range(2):
+        try:
+            with phase('render'):
+                path = chart_renderer.get(name, snap).result(timeout=CHART_TIMEOUT)
+        except Exception:
+            app.logger.exception('Could not create chart %s', name)
+            return {'error': 'Chart unavailable.'}, 503
+        try:
+            response = send_file(path, mimetype='image/png', max_age=31536000 if immutable else None, conditional=True, etag=True)
+            break
+        except FileNotFoundError:
+            # Removed by the render of a newer data version since get() found it; draw it again
+            if attempt:
+                return {'error': 'Chart unavailable.'}, 503
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+# Fleet rollups (see aggregates.py) as JSON, cached per data version and query
+aggregate_cache = LRUCache(max_entries=int(os.environ.get('SUSTAINABOS_AGGREGATE_CACHE_ENTRIES', '256')))
+datasets.on_load(lambda snap: aggregate_cache.clear())
+
+
+def render_aggregate(dimension, filters, snap):
+    with phase('lookup'):
+        engine = snap.aggregates
+        payload = {
+            'version': snap.hash[:16],
+            'dimension': dimension,
+            'filters': {name: list(values) for name, values in filters.items() if values},
+            'totals': engine.fleet(**filters),
+        }
+        if dimension != 'fleet':
+            payload['rows'] = records(engine.rollup(dimension, **filters))
+    with phase('serialize'):
+        return json.dumps(payload, separators=(',', ':'))
+
+
+@app.route('/api/aggregates/<dimension>')
+def fleet_aggregates(dimension):
+    # Filters: ?vessel=<name prefix>&device=<name>&status=<status>, each repeatable or comma separated
+    if dimension != 'fleet' and dimension not in DIMENSIONS:
+        return {'error': 'Dimension must be one of: fleet, ' + ', '.join(DIMENSIONS)}, 404
+    filters = {name: tuple(sorted(set(parse_filter(request.args.getlist(name))))) for name in ('vessel', 'device', 'status')}
+    snap = store.current()
+    key = (snap.version, dimension, tuple(filters.items()))
+    body = cached(aggregate_cache, 'aggregate', key, lambda: render_aggregate(dimension, filters, snap))
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.sha256(f'{snap.hash}:{key[1:]}'.encode('utf-8')).hexdigest()[:32])
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+# Cumulative realised savings over time (see timeline.py), cached like the rollups
+MAX_TIMELINE_SERIES = int(os.environ.get('SUSTAINABOS_MAX_TIMELINE_SERIES', '20'))
+
+
+def render_timeline(dimension, names, start, end, freq, snap):
+    with phase('lookup'):
+        window = snap.timeline.window(dimension, names, start, end, freq)
+    with phase('serialize'):
+        return json.dumps(dict(version=data_version(snap), dimension=dimension, **window), separators=(',', ':'))
+
+
+@app.route('/api/timeline/<dimension>')
+def savings_timeline(dimension):
+    # ?name=<vessel or device> (repeatable)&start=YYYY-MM-DD&end=YYYY-MM-DD&freq=day|month;
+    # the window runs from the first installation to today unless given
+    if dimension not in TIMELINE_DIMENSIONS:
+        return {'error': 'Dimension must be one of: ' + ', '.join(TIMELINE_DIMENSIONS)}, 404
+    names = [None] if dimension == 'fleet' else _requested_names('name')
+    if not names:
+        return {'error': 'Give at least one name.'}, 400
+    if len(names) > MAX_TIMELINE_SERIES:
+        return {'error': f'At most {MAX_TIMELINE_SERIES} names per request.'}, 400
+    freq = request.args.get('freq', 'month')
+    if freq not in TIMELINE_FREQUENCIES:
+        return {'error': 'freq must be one of: ' + ', '.join(TIMELINE_FREQUENCIES)}, 400
+    try:
+        start = parse_date(request.args.get('start'), 'start')
+        end = parse_date(request.args.get('end'), 'end') or datetime.date.today()
+    except ExportError as e:
+        return {'error': str(e)}, 400
+    snap = store.current()
+    key = (snap.version, 'timeline', dimension, tuple(names), start, end, freq)
+    try:
+        body = cached(aggregate_cache, 'aggregate', key, lambda: render_timeline(dimension, names, start, end, freq, snap))
+    except TimelineError as e:
+        return {'error': str(e)}, 400
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.sha256(f'{snap.hash}:{key[1:]}'.encode('utf-8')).hexdigest()[:32])
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+# Device rows of the tracker as CSV, NDJSON or XLSX, streamed (see export.py)
+@app.route('/api/export/<fmt>')
+def export_tracker(fmt):
+    # ?vessel=<name prefix>&device=<name>&status=<status>&since=YYYY-MM-DD&until=YYYY-MM-DD&columns=vessel,device,...
+    if fmt not in EXPORT_FORMATS:
+        return {'error': 'Format must be one of: ' + ', '.join(EXPORT_FORMATS)}, 404
+    try:
+        columns = parse_columns(request.args.getlist('columns'))
+        since = parse_date(request.args.get('since'), 'since')
+        until = parse_date(request.args.get('until'), 'until')
+    except ExportError as e:
+        return {'error': str(e)}, 400
+    snap = store.current()
+    with phase('lookup'):
+        positions = select_export_rows(
+            snap.devices,
+            vessel=parse_filter(request.args.getlist('vessel')),
+            device=parse_filter(request.args.getlist('device')),
+            status=parse_filter(request.args.getlist('status')),
+            since=since,
+            until=until,
+        )
+    response = Response(EXPORT_STREAMS[fmt](snap.devices, positions, columns), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="tracker-{data_version(snap)}.{fmt}"'
+    response.headers['X-Export-Rows'] = str(len(positions))
+    response.cache_control.no_cache = True
+    return response
+
+
+# Static images are served resized and re-encoded through /img (see images.py)
+images = ImagePipeline(app.static_folder)
+
+
+@app.template_global()
+def image_url(filename, width=None, fmt=None):
+    source = images.source(filename)
+    if source is None:
+        return url_for('static', filename=filename)
+    width = images.choose_width(source, width)
+    return url_for('image', filename=filename, w=width, f=fmt, v=source.digest[:16])
+
+
+@app.template_global()
+def image_srcset(filename, max_width=None):
+    """srcset value listing every derivative width of a static image, up to max_width."""
+    source = images.source(filename)
+    if source is None:
+        return ''
+    return ', '.join(f'{image_url(filename, width)} {width}w' for width in source.widths(max_width))
+
+
+@app.route('/img/<path:filename>')
+def image(filename):
+    # ?w=<css px> picks the width, the Accept header (or ?f=) the format
+    source = images.source(filename)
+    if source is None:
+        return {'error': 'Unknown image.'}, 404
+    width = images.choose_width(source, request.args.get('w', type=int))
+    fmt = images.choose_format(source, request.headers.get('Accept'), request.args.get('f'))
     try:
-        vessels_of_interest = df[df['Vessel Name/ ID'].astype(str).str.contains('Britoil|ENA Habitat|BOS|Lewek Hydra|Nautical Aisia|Nautical Anisha|Paragon Sentinel', na=False)]
-        vessel_devices = vessels_of_interest[['Vessel Name/ ID', 'Devices', 'Installation Status', 'Savings/year (fuel efficiency)', 'Savings/year (Maitenance)', 'Co2 savings ton/year']]
-        vessel_devices['Savings/year (fuel efficiency)'] = pd.to_numeric(vessel_devices['Savings/year (fuel efficiency)'], errors='coerce')
-        vessel_devices['Savings/year (Maitenance)'] = pd.to_numeric(vessel_devices['Savings/year (Maitenance)'], errors='coerce')
-        vessel_devices['Co2 savings ton/year'] = pd.to_numeric(vessel_devices['Co2 savings ton/year'], errors='coerce')
-        vessel_devices['Total Savings'] = vessel_devices['Savings/year (fuel efficiency)'].fillna(0) + vessel_devices['Savings/year (Maitenance)'].fillna(0) + vessel_devices['Co2 savings ton/year'].fillna(0)
-        top_vessels = vessel_devices.groupby('Vessel Name/ ID')['Total Savings'].sum().nlargest(10).reset_index()
-        plt.figure(figsize=(10, 6))
-        plt.bar(top_vessels['Vessel Name/ ID'], top_vessels['Total Savings'])
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        os.makedirs('static', exist_ok=True)
-        plt.savefig('static/top_vessels_chart.png')
-        plt.close()
-    except Exception as e:
-        print('Could not create chart:', e)
+        path = images.variant(source, width, fmt)
+    except Exception:
+        app.logger.exception('Could not encode %s', filename)
+        return send_file(source.path, conditional=True)
+    immutable = request.args.get('v') == source.digest[:16]
+    response = send_file(path, mimetype=images.mimetype(fmt), max_age=31536000 if immutable else None, conditional=True, etag=True)
+    response.vary.add('Accept')
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+@app.route('/admin/stats')
+def admin_stats():
+    if not token_matches(ADMIN_TOKEN, request.headers.get('X-Admin-Token')):
+        return {'error': 'Forbidden'}, 403
+    snap = store.current()
+    return {'dataset': current_dataset().id, 'version': snap.version, 'hash': snap.hash, 'loaded_at': snap.loaded_at, 'edit_id': snap.edit_id, 'coercion': snap.info.get('coercion', {}), 'pending_edits': len(journal.pending()), 'fragment_cache': fragment_cache.stats(), 'aggregate_cache': aggregate_cache.stats(), 'datasets': datasets.stats()}
+
+
+@app.route('/api/datasets')
+def dataset_list():
+    # Ids to put in /d/<dataset>/ URLs, and which ones are in memory in this worker
+    stats = datasets.stats()
+    return {'default': stats['default'], 'current': current_dataset().id,
+            'datasets': [dict(id=name, **entry) for name, entry in stats['datasets'].items()]}
+
+
+# Scraped by Prometheus. Open unless SUSTAINABOS_METRICS_TOKEN is set, then it
+# takes that token as a bearer token.
+CACHES = {'fragment': lambda: fragment_cache, 'tracker': lambda: tracker_cache, 'aggregate': lambda: aggregate_cache}
+
+
+def _cache_stat(stat):
+    return lambda: {(name, ): get().stats()[stat] for name, get in CACHES.items()}
+
+for _stat, _kind, _help in (
+    ('hits', 'counter', 'Cache lookups answered from the cache.'),
+    ('misses', 'counter', 'Cache lookups that had to render.'),
+    ('evictions', 'counter', 'Entries evicted to stay within the cache limits.'),
+    ('entries', 'gauge', 'Entries in the cache.'),
+    ('size', 'gauge', 'Size of the cached values (bytes, characters for text).'),
+):
+    _name = f'sustainabos_cache_{_stat}' + ('_total' if _kind == 'counter' else '')
+    (registry.collected_counter if _kind == 'counter' else registry.gauge)(_name, _help, _cache_stat(_stat), ('cache',))
+
+registry.gauge('sustainabos_snapshot_age_seconds', 'Seconds since the current data snapshot was built.', lambda: time.time() - store.current().loaded_at)
+registry.gauge('sustainabos_snapshot_version', 'Version number of the current data snapshot in this worker.', lambda: store.current().version)
+registry.gauge('sustainabos_tracker_rows', 'Rows of the Tracker table in the current snapshot.', lambda: len(store.current().list_df))
+registry.gauge('sustainabos_coercion_failures', 'Tracker cells that could not be converted to their column type.',
+               lambda: sum(report.get('failed', 0) for report in store.current().info.get('coercion', {}).values()))
+registry.gauge('sustainabos_pending_edits', 'Status edits not written back to the workbook yet.', lambda: len(journal.pending()))
+registry.gauge('sustainabos_datasets_loaded', 'Datasets with their tables in memory.', lambda: len(datasets.stats()['lru']))
+registry.gauge('sustainabos_dataset_memory_bytes', 'Estimated memory of the tables of each loaded dataset.',
+               lambda: {(name, ): entry['size'] for name, entry in datasets.stats()['datasets'].items() if entry['loaded']}, ('dataset',))
+registry.collected_counter('sustainabos_dataset_loads_total', 'Dataset workbook loads, including reloads after an eviction.', lambda: datasets.loads)
+registry.collected_counter('sustainabos_dataset_evictions_total', 'Datasets evicted to stay within the dataset limits.', lambda: datasets.evictions)
+registry.gauge('process_resident_memory_bytes', 'Resident memory size in bytes.', resident_memory)
+registry.gauge('process_max_resident_memory_bytes', 'Peak resident memory size in bytes.', peak_resident_memory)
+
+
+@app.route('/metrics')
+def metrics():
+    if METRICS_TOKEN and not token_matches(f'Bearer {METRICS_TOKEN}', request.headers.get('Authorization')):
+        return {'error': 'Forbidden'}, 403
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/admin/flush', methods=['POST'])
+def admin_flush():
+    # Write pending status edits to the workbook now instead of waiting for the next batch
+    if not token_matches(ADMIN_TOKEN, request.headers.get('X-Admin-Token')):
+        return {'error': 'Forbidden'}, 403
+    return {'written': flush(journal, current_dataset().path, blocking=True)}
 
 # ---- HTML template (original UI preserved) ----
 html_template = """
@@ -129,9 +908,9 @@ html_template = """
 <head>
   <meta charset="utf-8">
   <meta name="viewport" content="width=device-width, initial-scale=1, maximum-scale=1, user-scalable=no">
-  <link rel="manifest" href="/manifest.json">
+  <link rel="manifest" href="{{ url_for('manifest') }}">
   <meta name="theme-color" content="#4caf50">
-  <link rel="icon" href="{{ url_for('static', filename='favicon.ico') }}" type="image/x-icon">
+  <link rel="icon" href="{{ image_url('favicon.ico', 64, 'png') }}" type="image/png">
     <style>
 /* Responsive overrides for mobile */
 :root{ --primary:#4caf50; }
@@ -179,7 +958,9 @@ html_template = """
         }
 
         function loadPowerBIReport() {
-           document.getElementById("analyticsContainer").innerHTML = `
+           var container = document.getElementById("analyticsContainer");
+           if (container.firstElementChild) { return; }
+           container.innerHTML = `
            <iframe title="SustainaBOS7" width="950" height="1250"
         src="https://app.powerbi.com/reportEmbed?reportId=19eea1f2-00f5-4fcf-8d6d-6bed6f27d0e5&autoAuth=true&ctid=0bb4d87c-b9a5-49c3-8a59-4347acef01d8&navContentPaneEnabled=false&filterPaneEnabled=false"
            frameborder="0" allowFullScreen="true">
@@ -187,16 +968,44 @@ html_template = """
     `      ;
         }
 
+        function loadSection(section) {
+            // A section's body is fetched the first time its tab is opened
+            if (!section.dataset.src) { return Promise.resolve(); }
+            if (!section.loading) {
+                section.loading = fetch(section.dataset.src).then(function(r) {
+                    if (!r.ok) { throw new Error(r.status); }
+                    return r.text();
+                }).then(function(html) {
+                    section.innerHTML = html;
+                    delete section.dataset.src;
+                }).catch(function() {
+                    section.loading = null;
+                    section.innerHTML = '<p>This section could not be loaded. Open the tab again to retry.</p>';
+                    throw new Error('section not loaded');
+                });
+            }
+            return section.loading;
+        }
+
         function showSection(sectionId) {
             // hide all
             var sections = ['welcome', 'list', 'analytics', 'report', 'contact'];
             sections.forEach(function(s) { document.getElementById(s).classList.add('hidden'); });
             // show the requested
-            document.getElementById(sectionId).classList.remove('hidden');
-            // load analytics lazily
-            if (sectionId === 'analytics') {
-                loadPowerBIReport();
-            }
+            var section = document.getElementById(sectionId);
+            section.classList.remove('hidden');
+            loadSection(section).then(function() {
+                // load analytics lazily
+                if (sectionId === 'analytics') {
+                    loadPowerBIReport();
+                }
+            }).catch(function() {});
+        }
+
+        function openReport() {
+            // The PDF is only downloaded when asked for
+            var viewer = document.getElementById('reportViewer');
+            viewer.innerHTML = '<iframe src="' + viewer.dataset.src + '" width="100%" height="600px"></iframe>';
         }
 
         // Misc helpers preserved from original app
@@ -230,14 +1039,54 @@ html_template = """
         deviceSelector.style.display = 'block';
         }
 
+        // Data version of this page. Lookups carrying it can be answered by the
+        // service worker from its offline copy of the tracker.
+        let dataVersion = '{{ data_version }}';
+
+        // Fill an input's datalist with /search results as the user types
+        const typeaheadTimers = {};
+        function typeahead(input, kind){
+            clearTimeout(typeaheadTimers[input.id]);
+            typeaheadTimers[input.id] = setTimeout(()=>{
+                const q = input.value.trim();
+                const list = document.getElementById(input.getAttribute('list'));
+                if(!q){ list.innerHTML = ''; return; }
+                fetch('{{ url_for('search') }}?' + new URLSearchParams({q:q, kind:kind, v:dataVersion})).then(r=>r.json()).then(data=>{
+                    if(input.value.trim() !== q){ return; }
+                    list.innerHTML = '';
+                    data.results.forEach(item=>{
+                        const option = document.createElement('option');
+                        option.value = item.name;
+                        if(item.spec){ option.label = item.name + ' (' + item.spec + ')'; }
+                        list.appendChild(option);
+                    });
+                }).catch(()=>{});
+            }, 150);
+        }
+
         function confirmVesselSelection(){
             const v = document.getElementById('vesselDropdown').value;
-            fetch('/get_vessel_summary', {method:'POST', headers:{'Content-Type':'application/json'}, body:JSON.stringify({vesselName:v})}).then(r=>r.text()).then(html=>{ document.getElementById('vesselSummaryDisplay').innerHTML = html; }).catch(()=>alert('Error'));
+            fetch('{{ url_for('vessel_summary_lookup') }}?' + new URLSearchParams({name:v, v:dataVersion})).then(r=>r.text()).then(html=>{ document.getElementById('vesselSummaryDisplay').innerHTML = html; }).catch(()=>alert('Error'));
+            document.getElementById('statusEditor').style.display = currentAction === 'modifyStatus' ? 'block' : 'none';
+        }
+
+        function saveStatus(){
+            const body = {
+                vesselName: document.getElementById('vesselDropdown').value,
+                deviceName: document.getElementById('statusDeviceDropdown').value,
+                status: document.getElementById('statusDropdown').value,
+                installationDate: document.getElementById('statusDate').value,
+                token: document.getElementById('statusToken').value
+            };
+            fetch('{{ url_for('update_status_route') }}', {method:'POST', headers:{'Content-Type':'application/json'}, body:JSON.stringify(body)})
+              .then(r=>r.json().then(data=>({ok:r.ok, data:data})))
+              .then(res=>{ if(!res.ok){ alert(res.data.error || 'Error'); return; } dataVersion = res.data.data_version; confirmVesselSelection(); })
+              .catch(()=>alert('Error'));
         }
 
         function confirmDeviceSelection(){
             const d = document.getElementById('deviceDropdown').value;
-            fetch('/get_device_summary', {method:'POST', headers:{'Content-Type':'application/json'}, body:JSON.stringify({deviceName:d})}).then(r=>r.text()).then(html=>{ document.getElementById('deviceSummaryDisplay').innerHTML = html; }).catch(()=>alert('Error'));
+            fetch('{{ url_for('device_summary_lookup') }}?' + new URLSearchParams({name:d, v:dataVersion})).then(r=>r.text()).then(html=>{ document.getElementById('deviceSummaryDisplay').innerHTML = html; }).catch(()=>alert('Error'));
         }
 
     </script>
@@ -245,20 +1094,20 @@ html_template = """
 <body>
 
     <div id="splash">
-    <img src="{{ url_for('static', filename='green_leaf.png') }}" alt="Logo" id="splash-logo">
+    <img src="{{ image_url('green_leaf.png', 128) }}" srcset="{{ image_srcset('green_leaf.png', 256) }}" sizes="64px" alt="Logo" id="splash-logo">
     <div id="splash-title">
         <span class="green">Sustaina</span><span class="purple">BOS</span>
     </div>
     </div>
 
     <a href="javascript:void(0);" id="fab-button" title="Reload Page">
-    <img src="{{ url_for('static', filename='green_leaf.png') }}" alt="FAB Logo">
+    <img src="{{ image_url('green_leaf.png', 128) }}" srcset="{{ image_srcset('green_leaf.png', 256) }}" sizes="64px" alt="FAB Logo">
     </a>
 
     <header>
       <div class="container">
         <div id="branding">
-          <img src="{{ url_for('static', filename='britoil_logo.png') }}" alt="Britoil Offshore Services Logo" style="height:38px;">
+          <img src="{{ image_url('britoil_logo.png') }}" srcset="{{ image_srcset('britoil_logo.png') }}" sizes="(max-width:900px) 274px, 217px" alt="Britoil Offshore Services Logo" style="height:38px;">
           
           <h1>Fleet Sustainability View</h1>
           <br>
@@ -278,13 +1127,74 @@ html_template = """
     <div class="container">
 
       <div id="welcome" class="section content">
+{{ welcome_section }}
+      </div>
+
+      <div id="list" class="section content hidden" data-src="{{ url_for('section', name='list', v=page_version) }}"></div>
+
+      <div id="analytics" class="section content hidden" data-src="{{ url_for('section', name='analytics', v=page_version) }}"></div>
+
+      <div id="report" class="section content hidden" data-src="{{ url_for('section', name='report', v=page_version) }}"></div>
+
+      <div id="contact" class="section content hidden" data-src="{{ url_for('section', name='contact', v=page_version) }}"></div>
+
+    </div>
+
+    <footer style="background: #2d2d2d; color: #fff; padding: 20px; margin-top: 30px;">
+       <div class="container" style="text-align: center;">
+         <p style="margin: 5px 0;">&copy; 2025 Britoil Offshore Services. All rights reserved.</p>
+         <p style="margin: 5px 0;">
+              <a href="mailto:info@britoil.com" style="color: #ccc; text-decoration: none;">Contact us</a> |
+              <a href="/privacy-policy" style="color: #ccc; text-decoration: none;">Privacy Policy</a> |
+              <a href="/terms-of-service" style="color: #ccc; text-decoration: none;">Terms of Service</a>
+         </p>
+       </div>
+    </footer>
+
+   <!-- JavaScript for splash animation -->
+   <script>
+      setTimeout(function () {
+         document.getElementById('splash').style.display = 'none';
+      }, 2500);
+      document.getElementById("fab-button").addEventListener("click", function() {
+            location.reload();
+      });
+      // Initialize showing welcome section
+      window.onload = function() {
+            showSection('welcome');
+
+      };
+   </script>
+
+    <script>
+    // PWA install prompt handling
+    let deferredPrompt;
+    window.addEventListener('beforeinstallprompt', (e) => {
+      e.preventDefault();
+      deferredPrompt = e;
+      // show a subtle hint on mobile (console for now)
+      console.log('PWA install available');
+    });
+    function promptInstall(){ if(deferredPrompt){ deferredPrompt.prompt(); deferredPrompt.userChoice.then(()=>{ deferredPrompt = null; }); } else { alert('Use browser menu -> Add to Home screen'); } }
+    // register service worker
+    if('serviceWorker' in navigator){ navigator.serviceWorker.register('{{ url_for('service_worker') }}').then(()=>console.log('SW registered')).catch(()=>console.log('SW failed')); }
+    </script>
+
+</body>
+</html>
+"""
+
+# Body of each section of the page. Only the landing one (welcome) is rendered
+# into the index; the others are fetched the first time their tab is opened.
+SECTION_TEMPLATES = {
+    'welcome': """
           <h2>Welcome</h2>
           <p>This is the Fleet Sustainability View powered by the Sustainabos tool.</p>
 
           <h3>Scope 1, 2, 3 - Reminder :</h3>
           <p> Here is both an explanation and a reminder of what these scopes are...</p>
 
-          <img src="{{ url_for('static', filename='Scopes.png') }}" alt="Scopes" style="width:950px; display: block; margin: auto;">
+          <img src="{{ image_url('Scopes.png', 960) }}" srcset="{{ image_srcset('Scopes.png') }}" sizes="(max-width:900px) 95vw, 950px" alt="Scopes" style="width:950px; display: block; margin: auto;">
 
           <br>
           <h3>Green News :</h3>
@@ -296,7 +1206,7 @@ html_template = """
           <br> <br>
           With these upgrades, BOS Princess will provide a stable and efficient platform for geotechnical operations, strengthening our commitment to advancing offshore wind energy. </p>
           <br> <br>
-          <img src="{{ url_for('static', filename='Princess.jpeg') }}" alt="Princess" style="height:600px; display: block; margin: auto;">
+          <img src="{{ image_url('Princess.jpeg', 960) }}" srcset="{{ image_srcset('Princess.jpeg') }}" sizes="(max-width:900px) 95vw, 801px" alt="Princess" loading="lazy" decoding="async" style="height:600px; display: block; margin: auto;">
 
       <br>
 
@@ -305,12 +1215,9 @@ html_template = """
 
       <br>
       <br>
-          <img src="{{ url_for('static', filename='view2.png') }}"  alt="ESG" style="height:400px; display: block; margin: auto;">
-
-      </div>
-
-      <div id="list" class="section content hidden">
-
+          <img src="{{ image_url('view2.png', 512) }}" srcset="{{ image_srcset('view2.png') }}" sizes="(max-width:900px) 95vw, 491px" alt="ESG" loading="lazy" decoding="async" style="height:400px; display: block; margin: auto;">
+""",
+    'list': """
           <h2>List</h2>
           <div style="display:flex; gap: 10px; flex-wrap:wrap;">
              <button onclick="showVessel()">Show Vessel</button>
@@ -320,21 +1227,32 @@ html_template = """
 
           <div id="vesselSelector" style="display:none; margin-top: 8px;">
             <label>Which vessel?</label>
-            <select id="vesselDropdown" style="width:100%; padding:8px; margin-top:6px;">
-              {% for vessel in listvessel_df['A'] %}
-                <option value="{{ vessel }}">{{ vessel }}</option>
-              {% endfor %}
-            </select>
+            <input id="vesselDropdown" list="vesselOptions" autocomplete="off" placeholder="Type a vessel name or spec" oninput="typeahead(this, 'vessel')" style="width:100%; padding:8px; margin-top:6px; box-sizing:border-box;">
+            <datalist id="vesselOptions"></datalist>
             <button onclick="confirmVesselSelection()" style="margin-top:8px;">Ok</button>
           </div>
 
-          <div id="deviceSelector" style="display:none; margin-top: 8px;">
+          <div id="statusEditor" style="display:none; margin-top: 8px;">
             <label>Which device?</label>
-            <select id="deviceDropdown" style="width:100%; padding:8px; margin-top:6px;">
-              {% for device in listdevice_df['Device'] %}
-                <option value="{{ device }}">{{ device }}</option>
+            <input id="statusDeviceDropdown" list="statusDeviceOptions" autocomplete="off" placeholder="Type a device name" oninput="typeahead(this, 'device')" style="width:100%; padding:8px; margin-top:6px; box-sizing:border-box;">
+            <datalist id="statusDeviceOptions"></datalist>
+            <label>New status</label>
+            <select id="statusDropdown" style="width:100%; padding:8px; margin-top:6px;">
+              {% for status in status_choices %}
+                <option value="{{ status }}">{{ status }}</option>
               {% endfor %}
             </select>
+            <label>Date of installation (optional)</label>
+            <input id="statusDate" type="text" style="width:100%; padding:8px; margin-top:6px; box-sizing:border-box;">
+            <label>Edit code</label>
+            <input id="statusToken" type="password" style="width:100%; padding:8px; margin-top:6px; box-sizing:border-box;">
+            <button onclick="saveStatus()" style="margin-top:8px;">Save</button>
+          </div>
+
+          <div id="deviceSelector" style="display:none; margin-top: 8px;">
+            <label>Which device?</label>
+            <input id="deviceDropdown" list="deviceOptions" autocomplete="off" placeholder="Type a device name" oninput="typeahead(this, 'device')" style="width:100%; padding:8px; margin-top:6px; box-sizing:border-box;">
+            <datalist id="deviceOptions"></datalist>
             <button onclick="confirmDeviceSelection()" style="margin-top:8px;">Ok</button>
           </div>
 
@@ -345,7 +1263,7 @@ html_template = """
           <br>
 
           <h3>New Initiatives - Look</h3>
-          <img src="{{ url_for('static', filename='initiatives1.png') }}"  alt="ini" style="height:300px; display: block; margin: auto;">
+          <img src="{{ image_url('initiatives1.png', 960) }}" srcset="{{ image_srcset('initiatives1.png') }}" sizes="(max-width:900px) 95vw, 739px" alt="ini" loading="lazy" decoding="async" style="height:300px; display: block; margin: auto;">
 
           <h3>Summary Track Sheet</h3>
           <table>
@@ -371,10 +1289,8 @@ html_template = """
               </tr>
               {% endfor %}
           </table>
-          {% endfor %}
-      </div>
-
-      <div id="analytics" class="section content hidden">
+""",
+    'analytics': """
           <h2>Analytics</h2>
 
           <p> You can interact with BI charts after sign in. Refresh if any issues </p>
@@ -396,14 +1312,14 @@ html_template = """
 
           <h3>Top Devices - CO2 saving</h3>
           <div style="display:flex; justify-content:center; gap:20px; flex-wrap:wrap;">
-             <img src="{{ url_for('static', filename='top_devices_chart.png') }}" alt="CO2 Savings by Devices" width="450">
-             <img src="{{ url_for('static', filename='top_vessels_chart.png') }}" alt="Top Vessels - Savings" width="450">
+             <img src="{{ url_for('chart', name='co2_by_device', v=chart_version) }}" alt="CO2 Savings by Devices" loading="lazy" decoding="async" width="450">
+             <img src="{{ url_for('chart', name='top_vessels', v=chart_version) }}" alt="Top Vessels - Savings" loading="lazy" decoding="async" width="450">
           </div>
 
           <h3>Track progress bars</h3>
           <div style="display: flex; justify-content: center; gap: 20px;">
-             <img src="{{ url_for('static', filename='track_chartEX.png') }}" alt="Track" width="450">
-             <img src="{{ url_for('static', filename='track_chartEX2.png') }}" alt="Track" width="450">
+             <img src="{{ image_url('track_chartEX.png', 512) }}" srcset="{{ image_srcset('track_chartEX.png', 960) }}" sizes="(max-width:900px) 95vw, 450px" alt="Track" loading="lazy" decoding="async" width="450">
+             <img src="{{ image_url('track_chartEX2.png', 512) }}" srcset="{{ image_srcset('track_chartEX2.png', 960) }}" sizes="(max-width:900px) 95vw, 450px" alt="Track" loading="lazy" decoding="async" width="450">
 
           </div>
           <br>
@@ -411,22 +1327,20 @@ html_template = """
           <h3>Overdue Jobs - Statistics for PMS</h3>
           <p> Besides Sustainability, I'm also doing statistics and analysis on PMS overdue tasks — this helps maintenance planning and budgeting.</p> <br><br>
           <div style="display: flex; justify-content: center; gap: 20px;">
-             <img src="{{ url_for('static', filename='OJ_worstEX.png') }}" alt="Track" width="450">
-             <img src="{{ url_for('static', filename='OJ_worstEX2.png') }}" alt="Track" width="450">
+             <img src="{{ image_url('OJ_worstEX.png', 512) }}" srcset="{{ image_srcset('OJ_worstEX.png', 960) }}" sizes="(max-width:900px) 95vw, 450px" alt="Track" loading="lazy" decoding="async" width="450">
+             <img src="{{ image_url('OJ_worstEX2.png', 512) }}" srcset="{{ image_srcset('OJ_worstEX2.png', 960) }}" sizes="(max-width:900px) 95vw, 450px" alt="Track" loading="lazy" decoding="async" width="450">
 
           </div>
-
-
-
-      </div>
-
-      <div id="report" class="section content hidden">
+""",
+    'report': """
          <h2>All Documents</h2>
          <br>
          <h3>Sustainability Report 2024</h3>
          Here is the sustainabilty report of 2024. I hope this helps for the 2025 report. Or help to do it. Here is the PDF display. <br> <br> 
-         <iframe src="{{ url_for('static', filename='Report2024.pdf') }}" width="100%" height="600px">
-         </iframe>
+         <div id="reportViewer" data-src="{{ url_for('static', filename='Report2024.pdf') }}">
+           <button onclick="openReport()">Show the report here</button>
+           <a href="{{ url_for('static', filename='Report2024.pdf') }}" target="_blank">Open the PDF</a>
+         </div>
 
          <div class="report-section" style="margin-top: 30px;">
            <h3>📄 Presentations</h3>
@@ -449,10 +1363,8 @@ html_template = """
                <li style="margin-bottom: 12px;"><a href="https://..." target="_blank">🔗 IWTM Samples Data & Analysis Britoil 121 (ex)</a></li>
              </ul>
          </div>
-      </div>
-
-      <div id="contact" class="section content hidden">
-
+""",
+    'contact': """
           <div id="instruction-box-nul" style="display: none; position: fixed; bottom: 20px; right: 20px; background: #fff; padding: 16px; border-radius: 8px; box-shadow: 0 5px 15px rgba(0,0,0,0.1); z-index: 9999; transition: opacity 1s ease; opacity: 0;">
               <strong>HELLO ! </strong><br><br>
               <b>Feel free to contact me ^^</b>
@@ -464,54 +1376,8 @@ html_template = """
           <p>Phone (FR): +33 771770134 </p>
 
           <button onclick="promptInstall()">Install app on this device</button>
-
-      </div>
-
-    </div>
-
-    <footer style="background: #2d2d2d; color: #fff; padding: 20px; margin-top: 30px;">
-       <div class="container" style="text-align: center;">
-         <p style="margin: 5px 0;">&copy; 2025 Britoil Offshore Services. All rights reserved.</p>
-         <p style="margin: 5px 0;">
-              <a href="mailto:info@britoil.com" style="color: #ccc; text-decoration: none;">Contact us</a> |
-              <a href="/privacy-policy" style="color: #ccc; text-decoration: none;">Privacy Policy</a> |
-              <a href="/terms-of-service" style="color: #ccc; text-decoration: none;">Terms of Service</a>
-         </p>
-       </div>
-    </footer>
-
-   <!-- JavaScript for splash animation -->
-   <script>
-      setTimeout(function () {
-         document.getElementById('splash').style.display = 'none';
-      }, 2500);
-      document.getElementById("fab-button").addEventListener("click", function() {
-            location.reload();
-      });
-      // Initialize showing welcome section
-      window.onload = function() {
-            showSection('welcome');
-
-      };
-   </script>
-
-    <script>
-    // PWA install prompt handling
-    let deferredPrompt;
-    window.addEventListener('beforeinstallprompt', (e) => {
-      e.preventDefault();
-      deferredPrompt = e;
-      // show a subtle hint on mobile (console for now)
-      console.log('PWA install available');
-    });
-    function promptInstall(){ if(deferredPrompt){ deferredPrompt.prompt(); deferredPrompt.userChoice.then(()=>{ deferredPrompt = null; }); } else { alert('Use browser menu -> Add to Home screen'); } }
-    // register service worker
-    if('serviceWorker' in navigator){ navigator.serviceWorker.register('/service-worker.js').then(()=>console.log('SW registered')).catch(()=>console.log('SW failed')); }
-    </script>
-
-</body>
-</html>
-"""
+""",
+}
 
 from flask import jsonify, Response, url_for, send_from_directory
 
@@ -520,37 +1386,376 @@ def manifest():
     manifest_data = {
         "name": "SustainaBOS",
         "short_name": "SustainaBOS",
-        "start_url": "/",
+        "start_url": url_for('index'),
         "display": "standalone",
         "background_color": "#ffffff",
         "theme_color": "#4caf50",
         "icons": [
-            {"src": url_for('static', filename='icons/icon-192.png'), "sizes": "192x192", "type": "image/png"},
-            {"src": url_for('static', filename='icons/icon-512.png'), "sizes": "512x512", "type": "image/png"}
+            {"src": image_url('icon-192.png.png', 192, 'png'), "sizes": "192x192", "type": "image/png"},
+            {"src": image_url('icon-512.png.png', 512, 'png'), "sizes": "512x512", "type": "image/png"}
         ]
     }
     return jsonify(manifest_data)
 
-@app.route('/service-worker.js')
-def service_worker():
-    js = """const CACHE_NAME = 'sustainabos-cache-v1';
+# The service worker is generated for each asset manifest version. It precaches
+# the fingerprinted static files and image derivatives the page links to and
+# keeps them in one cache across deploys, so a deploy makes browsers fetch
+# exactly the files whose content changed. On activation it drops the entries
+# the new page no longer links to and those of older data versions. It also
+# keeps an IndexedDB copy of the tracker (/api/tracker) to answer vessel and
+# device lookups locally and offline. Each dataset gets its own worker, scoped
+# to /d/<dataset>/, with its own cache and IndexedDB database.
+SERVICE_WORKER = """// Deploy %(version)s
+const CACHE_PREFIX = %(cache_prefix)s;
+const CACHE_NAME = CACHE_PREFIX + 'content';
+const INDEX = %(index)s;
+// Fetched on install unless already cached
+const PRECACHE = %(precache)s;
+// Every static file and image derivative the page links to, kept across deploys
+const KEEP = %(keep)s;
+const STATIC_PREFIXES = %(static_prefixes)s;
+// Sections are addressed by <data version><PAGE_SUFFIX>
+const PAGE_SUFFIX = %(page_suffix)s;
+const DEFAULT_DEVICE_STATUSES = %(default_statuses)s;
+const SYNC_INTERVAL = %(sync_interval)d;
+
+// Offline copy of the tracker (see /api/tracker), kept in IndexedDB
+function openDb() {
+  return new Promise((resolve, reject) => {
+    const req = indexedDB.open(%(db_name)s, 1);
+    req.onupgradeneeded = () => req.result.createObjectStore('tracker');
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  });
+}
+function withStore(mode, fn) {
+  return openDb().then((db) => new Promise((resolve, reject) => {
+    const tx = db.transaction('tracker', mode);
+    const req = fn(tx.objectStore('tracker'));
+    tx.oncomplete = () => resolve(req.result);
+    tx.onerror = () => reject(tx.error);
+  }));
+}
+const loadTracker = () => withStore('readonly', (store) => store.get('tracker')).catch(() => undefined);
+const saveTracker = (tracker) => withStore('readwrite', (store) => store.put(tracker, 'tracker'));
+
+let syncing = null;
+let lastSync = 0;
+function syncTracker(force) {
+  // Fetch the rows changed since the stored version (everything the first time)
+  if (syncing) {
+    return syncing;
+  }
+  if (!force && Date.now() - lastSync < SYNC_INTERVAL) {
+    return loadTracker();
+  }
+  syncing = loadTracker().then((tracker) =>
+    fetch(%(tracker_url)s + (tracker ? '?since=' + tracker.version : ''), {cache: 'no-cache'})
+      .then((response) => {
+        if (!response.ok) {
+          throw new Error('tracker sync failed: ' + response.status);
+        }
+        return response.json();
+      })
+      .then((data) => {
+        lastSync = Date.now();
+        if (data.full || !tracker) {
+          delete data.full;
+          tracker = data;
+        } else if (data.version !== tracker.version) {
+          tracker.rows.length = Math.min(tracker.rows.length, data.length);
+          for (const [i, row] of Object.entries(data.rows)) {
+            tracker.rows[Number(i)] = row;
+          }
+          if (data.vessels) {
+            tracker.vessels = data.vessels;
+          }
+          tracker.version = data.version;
+        } else {
+          return tracker;
+        }
+        return saveTracker(tracker).then(() => tracker);
+      })
+      .catch(() => tracker)
+  ).finally(() => { syncing = null; });
+  return syncing;
+}
+
+function escapeHtml(value) {
+  return String(value).replace(/[&<>"]/g, (c) => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})[c]);
+}
+function htmlTable(columns, rows) {
+  // Same markup as DataFrame.to_html in the server-side fragments
+  const head = columns.map((c) => '<th>' + escapeHtml(c) + '</th>').join('');
+  const body = rows.map((row) => '<tr>' + row.map((v) => '<td>' + (v === null ? '' : escapeHtml(v)) + '</td>').join('') + '</tr>').join('');
+  const html = '<table border="0" class="dataframe table table-bordered table-striped"><thead><tr style="text-align: right;">' + head + '</tr></thead><tbody>' + body + '</tbody></table>';
+  return new Response(html, {headers: {'Content-Type': 'text/html; charset=utf-8'}});
+}
+function notFound(message) {
+  return new Response(JSON.stringify({error: message}), {status: 404, headers: {'Content-Type': 'application/json'}});
+}
+function vesselSummary(tracker, params) {
+  const span = tracker.vessels[params.get('name')];
+  if (!span) {
+    return notFound('Vessel not found or data not loaded.');
+  }
+  return htmlTable(tracker.columns, tracker.rows.slice(span[0], span[1]));
+}
+function deviceSummary(tracker, params) {
+  const name = params.get('name');
+  let statuses = params.getAll('status').flatMap((s) => s.split(',')).map((s) => s.trim()).filter((s) => s);
+  if (!statuses.length) {
+    statuses = DEFAULT_DEVICE_STATUSES;
+  } else if (statuses.some((s) => s.toLowerCase() === 'all')) {
+    statuses = null;
+  }
+  const rows = [];
+  let vessel = null;
+  for (const row of tracker.rows) {
+    if (row[1] !== null) {
+      vessel = row[1];
+    }
+    if (row[3] === name && (statuses === null || statuses.includes(row[4]))) {
+      rows.push([vessel].concat(row.slice(3)));
+    }
+  }
+  if (!rows.length) {
+    return notFound('No data or device not found.');
+  }
+  return htmlTable(tracker.device_columns, rows);
+}
+const LOOKUPS = {[%(vessel_summary_url)s]: vesselSummary, [%(device_summary_url)s]: deviceSummary};
+
+function lookup(event, url, render) {
+  // Stale-while-revalidate: answer from the offline copy when it holds the
+  // page's data version, else ask the server and fall back to the copy offline
+  event.waitUntil(syncTracker(false));
+  event.respondWith(loadTracker().then((tracker) => {
+    if (tracker && tracker.version === url.searchParams.get('v')) {
+      return render(tracker, url.searchParams);
+    }
+    return fetch(event.request).catch(() => tracker ? render(tracker, url.searchParams) : Response.error());
+  }));
+}
+
+function precacheRequest(url) {
+  // Cached image derivatives are matched ignoring Vary: ask for a format every browser shows
+  return url.startsWith(STATIC_PREFIXES[1]) ? new Request(url, {headers: {Accept: 'image/webp,image/*;q=0.8'}}) : new Request(url);
+}
+function isLive(url, version) {
+  // Whether a cached URL is still linked from the page of this deploy and data version
+  const path = url.pathname + url.search;
+  if (url.pathname === INDEX) {
+    return true;
+  }
+  if (STATIC_PREFIXES.some((prefix) => path.startsWith(prefix))) {
+    return KEEP.includes(path);
+  }
+  const v = url.searchParams.get('v');
+  return v === version || v === version + PAGE_SUFFIX;
+}
+function prune(tracker) {
+  if (!tracker) {
+    // Offline: the current data version is unknown, keep everything
+    return;
+  }
+  return caches.open(CACHE_NAME).then((cache) => cache.keys().then((requests) => Promise.all(
+    requests.filter((request) => !isLive(new URL(request.url), tracker.version)).map((request) => cache.delete(request))
+  )));
+}
+
 self.addEventListener('install', (event) => {
+  // Content-addressed URLs cached by an earlier deploy are still valid; the page is always fetched fresh
   event.waitUntil(
-    caches.open(CACHE_NAME).then((cache) => cache.addAll(['/']))
+    caches.open(CACHE_NAME).then((cache) => Promise.all([cache.add(new Request(INDEX, {cache: 'reload'}))].concat(PRECACHE.map((url) =>
+      cache.match(url, {ignoreVary: true}).then((response) => response || cache.add(precacheRequest(url)))
+    )))).then(() => self.skipWaiting())
+  );
+});
+self.addEventListener('activate', (event) => {
+  // Caches of older workers were named after their deploy
+  event.waitUntil(
+    caches.keys().then((keys) => Promise.all(
+      keys.filter((key) => key.startsWith(CACHE_PREFIX) && key !== CACHE_NAME).map((key) => caches.delete(key))
+    )).then(() => self.clients.claim()).then(() => syncTracker(true)).then(prune)
   );
 });
 self.addEventListener('fetch', (event) => {
+  const request = event.request;
+  const url = new URL(request.url);
+  if (request.method !== 'GET' || url.origin !== self.location.origin) {
+    return;
+  }
+  if (LOOKUPS[url.pathname]) {
+    lookup(event, url, LOOKUPS[url.pathname]);
+    return;
+  }
+  if ((url.pathname !== INDEX && KEEP.includes(url.pathname + url.search)) || url.searchParams.has('v')) {
+    // Content-addressed: cache first
+    event.respondWith(
+      caches.match(request, {ignoreVary: true}).then((cached) => cached || fetch(request).then((response) => {
+        if (response.ok) {
+          const copy = response.clone();
+          caches.open(CACHE_NAME).then((cache) => cache.put(request, copy));
+        }
+        return response;
+      }))
+    );
+    return;
+  }
+  // Everything else: network first, cached copy when offline
+  if (url.pathname === INDEX) {
+    event.waitUntil(syncTracker(false));
+  }
   event.respondWith(
-    caches.match(event.request).then((response) => response || fetch(event.request))
+    fetch(request).then((response) => {
+      if (response.ok && url.pathname === INDEX) {
+        const copy = response.clone();
+        caches.open(CACHE_NAME).then((cache) => cache.put(request, copy));
+      }
+      return response;
+    }).catch(() => caches.match(request))
   );
 });
 """
-    return Response(js, mimetype='application/javascript')
+_service_workers = {}  # script root (dataset prefix) -> (manifest version, Encoded)
+_PAGE_URL = re.compile(r'\b(src|href|data-src|srcset)="([^"]*)"')
+
+
+def _asset_prefixes():
+    # URL prefixes of static files and of image derivatives, in this dataset
+    return [url_for('static', filename='_').removesuffix('_'), url_for('image', filename='_').removesuffix('_')]
+
+
+def page_asset_urls(snap):
+    """
+    (precache, keep) for the service worker: the static files (up to
+    PRECACHE_MAX_SIZE) and image derivatives (as in src) the page and its
+    sections link to, and every static and image URL they reference,
+    including the other widths of each srcset.
+    """
+    static_prefix, image_prefix = _asset_prefixes()
+    pages = [render_index(snap)[1]]
+    for name in section_templates:
+        if name != 'welcome':
+            pages.append(cached(fragment_cache, 'fragment', (snap.version, 'section', name, request.script_root), lambda: render_section(name, snap)))
+    precache = []
+    keep = []
+    for page in pages:
+        for attribute, value in _PAGE_URL.findall(page.body.decode('utf-8')):
+            value = html_lib.unescape(value)
+            urls = [entry.split()[0] for entry in value.split(',') if entry.strip()] if attribute == 'srcset' else [value]
+            for url in urls:
+                if url.startswith(static_prefix):
+                    asset, _ = assets.resolve(unquote(url[len(static_prefix):]))
+                    keep.append(url)
+                    if asset is not None and attribute in ('src', 'href') and assets.precache(PRECACHE_MAX_SIZE, [asset.name]):
+                        precache.append(url)
+                elif url.startswith(image_prefix):
+                    keep.append(url)
+                    if attribute == 'src':
+                        precache.append(url)
+    return list(dict.fromkeys(precache)), list(dict.fromkeys(keep))
+
+
+# Minimum seconds between two tracker syncs of the service worker
+SYNC_INTERVAL = int(os.environ.get('SUSTAINABOS_SYNC_INTERVAL', '30'))
+
+
+@app.route('/service-worker.js')
+def service_worker():
+    root = request.script_root
+    entry = _service_workers.get(root)
+    if entry is None or entry[0] != assets.version:
+        precache, keep = page_asset_urls(store.current())
+        js = SERVICE_WORKER % {
+            # Names the default dataset's worker has always used; '/' can't appear in dataset ids
+            'cache_prefix': json.dumps(f'sustainabos{root}/' if root else 'sustainabos-'),
+            'db_name': json.dumps(f'sustainabos{root}' if root else 'sustainabos'),
+            'index': json.dumps(url_for('index')),
+            'tracker_url': json.dumps(url_for('tracker_data')),
+            'vessel_summary_url': json.dumps(url_for('vessel_summary_lookup')),
+            'device_summary_url': json.dumps(url_for('device_summary_lookup')),
+            'version': assets.version,
+            'precache': json.dumps(precache, indent=2),
+            'keep': json.dumps(keep, indent=2),
+            'static_prefixes': json.dumps(_asset_prefixes()),
+            'page_suffix': json.dumps(PAGE_SUFFIX),
+            'default_statuses': json.dumps(list(DEFAULT_DEVICE_STATUSES)),
+            'sync_interval': SYNC_INTERVAL * 1000,
+        }
+        entry = _service_workers[root] = (assets.version, Encoded(js))
+    response = send_encoded(entry[1], 'application/javascript')
+    response.cache_control.no_cache = True
+    return response
+
+
+# The index page only depends on the data snapshot, so the template is compiled
+# once and the rendered page is kept until the next reload, one per dataset.
+# The ETag (the page version: data, templates and static files) lets the PWA
+# and browsers revalidate with a 304 instead of downloading it again. There is
+# no Last-Modified: the workbook's mtime doesn't change with a deploy.
+index_template = app.jinja_env.from_string(html_template)
+section_templates = {name: app.jinja_env.from_string(source) for name, source in SECTION_TEMPLATES.items()}
+_TEMPLATE_HASH = hashlib.sha256(''.join([html_template, *SECTION_TEMPLATES.values()]).encode('utf-8')).hexdigest()[:12]
+_index_pages = {}  # script root (dataset prefix) -> (snapshot version, etag, Encoded html)
+_index_lock = threading.Lock()
+
+
+# Changes with the templates or any static file
+PAGE_SUFFIX = f'-{_TEMPLATE_HASH}-{assets.version}'
+
+
+def page_version(snap):
+    # Changes with the data, the templates or any static file
+    return data_version(snap) + PAGE_SUFFIX
+
+
+def page_context(snap):
+    context = dict(summary_df=snap.summary_df, summary2_df=snap.summary2_df, summary3_df=snap.summary3_df, listvessel_df=snap.listvessel_df, listdevice_df=snap.listdevice_df, chart_version=snap.hash[:16], data_version=data_version(snap), page_version=page_version(snap), status_choices=STATUS_CHOICES)
+    app.update_template_context(context)
+    return context
+
+
+def render_section(name, snap):
+    with phase('render'):
+        return Encoded(section_templates[name].render(page_context(snap)))
+
+
+@app.route('/sections/<name>')
+def section(name):
+    # With ?v=<page version> the fragment is cached for good, like the lookups
+    if name not in section_templates:
+        return {'error': 'Unknown section.'}, 404
+    snap = store.current()
+    html = cached(fragment_cache, 'fragment', (snap.version, 'section', name, request.script_root), lambda: render_section(name, snap))
+    return send_fragment(html, snap, page_version(snap))
+
+
+def render_index(snap):
+    # The page links to the dataset's own URLs, so it is kept per script root
+    root = request.script_root
+    entry = _index_pages.get(root)
+    if entry is not None and entry[0] == snap.version:
+        return entry[1], entry[2]
+    with _index_lock:
+        entry = _index_pages.get(root)
+        if entry is None or entry[0] != snap.version:
+            context = page_context(snap)
+            with phase('render'):
+                context['welcome_section'] = Markup(section_templates['welcome'].render(context))
+                html = Encoded(index_template.render(context))
+            entry = _index_pages[root] = (snap.version, page_version(snap), html)
+    return entry[1], entry[2]
 
 
 @app.route('/')
 def index():
-    return render_template_string(html_template, vessel_devices=df, summary_df=summary_df, summary2_df=summary2_df, summary3_df=summary3_df, listvessel_df=listvessel_df, listdevice_df=listdevice_df)
+    snap = store.current()
+    etag, html = render_index(snap)
+    response = send_encoded(html, 'text/html', etag=etag)
+    response.cache_control.no_cache = True
+    return response
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,155 @@
+"""
+Fingerprinted static assets and precompressed response bodies.
+
+AssetManifest hashes every file under static/ when the app starts.
+url_for('static', ...) then builds URLs with the hash in the file name
+(green_leaf.a75e668de2.png), which can be cached forever because any change
+to the file changes its URL. Plain names keep working but must be
+revalidated. The manifest version (a hash over all the file hashes) names the
+service worker cache, so a deploy only invalidates what it changed.
+
+Encoded holds a response body together with its gzip and brotli encodings,
+computed once when the body is rendered (index page, table fragments) or
+first served (text files under static/) rather than on every request.
+Brotli is used when the Brotli package is installed. Bodies that are not
+cached (search results) are built with fast=True: one gzip pass at the
+fastest level, which costs less than it saves on the wire.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+
+from loader import CACHE_DIR, file_hash
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ASSET_DIR = os.path.join(CACHE_DIR, 'assets')
+
+# Bodies smaller than this are sent as they are
+MIN_COMPRESS_SIZE = 1024
+
+# Files under static/ worth compressing (images and PDFs already are)
+COMPRESSIBLE = ('.html', '.css', '.js', '.mjs', '.json', '.svg', '.txt', '.xml', '.webmanifest', '.ico')
+
+# Best first
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data, encoding, fast=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=1 if fast else 11)
+    return gzip.compress(data, compresslevel=1 if fast else 9, mtime=0)
+
+
+def choose_encoding(accept_encodings, available):
+    """Best of the available encodings the client accepts (a werkzeug Accept), or None."""
+    for encoding in ENCODINGS:
+        if encoding in available and accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+class Encoded:
+    """A response body plus its precomputed compressed encodings."""
+
+    def __init__(self, body, fast=False):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.encodings = {}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            for encoding in ('gzip',) if fast else ENCODINGS:
+                data = compress(body, encoding, fast)
+                if len(data) < len(body):
+                    self.encodings[encoding] = data
+
+    def select(self, accept_encodings):
+        """(encoding or None, bytes) to send for a request's Accept-Encoding."""
+        encoding = choose_encoding(accept_encodings, self.encodings)
+        if encoding is None:
+            return None, self.body
+        return encoding, self.encodings[encoding]
+
+    def __len__(self):
+        return len(self.body) + sum(len(data) for data in self.encodings.values())
+
+
+class Asset:
+    def __init__(self, name, path, digest, size):
+        self.name = name
+        self.path = path
+        self.digest = digest
+        self.size = size
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        stem, ext = os.path.splitext(name)
+        self.url_name = f'{stem}.{digest[:10]}{ext}'
+        self.compressible = ext.lower() in COMPRESSIBLE and size >= MIN_COMPRESS_SIZE
+
+
+class AssetManifest:
+    def __init__(self, static_dir, directory=ASSET_DIR):
+        self.static_dir = os.path.abspath(static_dir)
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.scan()
+
+    def scan(self):
+        """Hash every file under static/ (again)."""
+        assets = {}
+        for root, dirs, files in os.walk(self.static_dir):
+            dirs.sort()
+            for file_name in sorted(files):
+                path = os.path.join(root, file_name)
+                name = os.path.relpath(path, self.static_dir).replace(os.sep, '/')
+                assets[name] = Asset(name, path, file_hash(path), os.path.getsize(path))
+        self.assets = assets
+        self._by_url_name = {asset.url_name: asset for asset in assets.values()}
+        self.version = hashlib.sha256(''.join(f'{a.name}:{a.digest}\n' for a in assets.values()).encode('utf-8')).hexdigest()[:12]
+        logger.info('Asset manifest %s: %d files', self.version, len(assets))
+
+    def url_name(self, name):
+        """Fingerprinted file name for a static file (the name itself if unknown)."""
+        asset = self.assets.get(name)
+        return asset.url_name if asset is not None else name
+
+    def resolve(self, url_name):
+        """(asset, fingerprinted) for a requested static file name, (None, False) if there is none."""
+        asset = self._by_url_name.get(url_name)
+        if asset is not None:
+            return asset, True
+        return self.assets.get(url_name), False
+
+    def variant(self, asset, accept_encodings):
+        """(encoding or None, path) of the file to send for a request's Accept-Encoding."""
+        if not asset.compressible:
+            return None, asset.path
+        encoding = choose_encoding(accept_encodings, ENCODINGS)
+        if encoding is None:
+            return None, asset.path
+        path = os.path.join(self.directory, f"{asset.url_name.replace('/', '_')}.{encoding}")
+        if not os.path.exists(path):
+            with self._lock:
+                if not os.path.exists(path):
+                    with open(asset.path, 'rb') as f:
+                        data = compress(f.read(), encoding)
+                    os.makedirs(self.directory, exist_ok=True)
+                    tmp = f'{path}.{os.getpid()}.tmp'
+                    with open(tmp, 'wb') as f:
+                        f.write(data)
+                    os.replace(tmp, path)
+        return encoding, path
+
+    def precache(self, max_size, names=None):
+        """Files (of names, if given) small enough for the service worker to precache."""
+        names = self.assets if names is None else names
+        return [name for name in names if name in self.assets and self.assets[name].size <= max_size]
@@ -0,0 +1,142 @@
+"""
+Synthetic tracker workbooks for benchmarking.
+
+Writes an xlsx with the same layout as "Vessel_Device_Installation_Tracker
+NV.xlsx": a Tracker sheet with its header on row 8 and, from row 9, vessel
+header rows (N, name, spec and a '↓' device cell) each followed by one row
+per device with a blank N, then a Summary sheet with the device table from
+A2 and the vessel list in column A from row 26. Formula columns are written
+as plain values, which is what pandas reads from the real file's cached
+results.
+
+    python bench/make_tracker.py --rows 10000 --output /tmp/tracker-10k.xlsx
+"""
+
+import argparse
+import datetime
+import random
+
+from openpyxl import Workbook
+
+DEVICES = [
+    'MGPS', 'Chlorinator', 'CMCE LP', 'CJC Filter', 'IWTM Filter', 'LED lights', 'EFMS', 'Deva Paint',
+    'AI CCTV', 'Spinergie Fleet', 'Nautilus Log', 'RE Conversion', 'SeaQuest Endura', 'Hempaguard', 'IOW Separator',
+]
+SPECS = [
+    'AHT E', 'AHT E DP1', 'AHT E DP2', 'AHTS A DP1', 'AHTS A DP2', 'AHTS C DP2', 'AHTS D DP2', 'AHTS G DP2',
+    'AHTS H DP2', 'AHTS T DP1', 'AHTS T DP2', 'MPSV DP2', 'OSV A DP2', 'PSV B DP2', 'PSV DP2 D', 'PSV J DP2', 'PSV P DP2',
+]
+STATUSES = ['Not Installed', 'In Process', 'Done', 'No Need', None]
+STATUS_WEIGHTS = [45, 6, 37, 9, 3]
+PREFIXES = ['Britoil', 'BOS']
+# (fuel, maintenance, co2) savings per installed device
+SAVINGS = {device: (random.Random(device).uniform(1000, 12000), random.Random(device + 'm').uniform(200, 3000), random.Random(device + 'c').uniform(5, 80)) for device in DEVICES}
+
+HEADER = [None, 'N', 'Vessel Name/ ID', 'Spec', 'Devices', 'Installation Status', 'Date of Installation',
+          'Scope 1 Expected Savings/year', 'Scope 3 Expected Savings/year', 'Co2 savings ton/year', 'Chief Engineer Name']
+
+
+def _install_date(rng):
+    day = datetime.date(2015, 1, 1) + datetime.timedelta(days=rng.randrange(3800))
+    kind = rng.random()
+    # Like the real sheet: mostly real dates, some typed as text
+    if kind < 0.7:
+        return datetime.datetime(day.year, day.month, day.day)
+    if kind < 0.9:
+        return day.strftime('%d-%b. %Y')
+    return day.strftime('%d/%m/%Y')
+
+
+def tracker_rows(total_rows, rng):
+    """Data rows of the Tracker sheet (from row 9), as lists for columns A:K."""
+    rows = []
+    vessels = []
+    n = 0
+    while len(rows) < total_rows:
+        n += 1
+        name = f'{rng.choice(PREFIXES)} {n}'
+        vessels.append(name)
+        spec = rng.choice(SPECS)
+        rows.append(['a', n, name, spec, '↓', None, None, None, None, None, None])
+        devices = rng.sample(DEVICES, rng.randint(4, min(14, len(DEVICES))))
+        for device in devices:
+            if len(rows) >= total_rows:
+                break
+            status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+            done = status == 'Done'
+            fuel, maintenance, co2 = SAVINGS[device]
+            rows.append([
+                None, None, None, None, device, status,
+                _install_date(rng) if status in ('Done', 'In Process') and rng.random() < 0.3 else None,
+                round(fuel, 2) if done else None,
+                round(maintenance, 2) if done else None,
+                round(co2, 3) if done else None,
+                None,
+            ])
+    return rows, vessels
+
+
+def summary_rows(tracker, vessels):
+    """Rows of the Summary sheet from row 1."""
+    counts = {device: {'Done': 0, 'In Process': 0, 'No Need': 0, 'all': 0} for device in DEVICES}
+    for row in tracker:
+        if row[4] in counts:
+            counts[row[4]]['all'] += 1
+            if row[5] in counts[row[4]]:
+                counts[row[4]][row[5]] += 1
+    total_savings = sum((row[7] or 0) + (row[8] or 0) for row in tracker)
+    total_co2 = sum(row[9] or 0 for row in tracker)
+
+    rows = [[None] * 8 + ['↓', 'Last 12 months', 'Goal next 12 months']]
+    rows.append(['Device', 'Scopes', 'Total Installed', 'In process', 'Needed', 'Percentage in move', 'POC OK?', None,
+                 'Installation Progress', None, 0.8])
+    for device in DEVICES:
+        c = counts[device]
+        needed = c['all'] - c['No Need']
+        rows.append([device, '1, 3', c['Done'], c['In Process'], needed, (c['Done'] + c['In Process']) / needed if needed else None, True])
+    while len(rows) < 20:
+        rows.append([])
+    rows.append([None, 'Total Savings ', total_savings])
+    rows.append([None, 'CO2eq  (tons)', total_co2])
+    rows.append([None, 'New Initiatives', len(DEVICES)])
+    rows.append([])
+    rows.append(['BOS DUBAI', None, 'BOS SG', None, 'BOS ITALY'])
+    for vessel in vessels:
+        rows.append([vessel])
+    return rows
+
+
+def make_tracker(path, total_rows, seed=0):
+    """Write a synthetic workbook with total_rows Tracker data rows. Returns the vessel names."""
+    rng = random.Random(seed)
+    tracker, vessels = tracker_rows(total_rows, rng)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Tracker')
+    ws.append([])
+    ws.append([None, 'This is the Vessel Installation Tracker Sheet. ', None, None, 'EACH VESSEL :    WHAT TO DO ?'])
+    for _ in range(5):
+        ws.append([])
+    ws.append(HEADER)
+    for row in tracker:
+        ws.append(row)
+
+    ws = wb.create_sheet('Summary')
+    for row in summary_rows(tracker, vessels):
+        ws.append(row)
+    wb.save(path)
+    return vessels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000, help='Tracker data rows (vessel and device rows)')
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    vessels = make_tracker(args.output, args.rows, args.seed)
+    print(f'Wrote {args.output}: {args.rows} rows, {len(vessels)} vessels')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Scale benchmark on synthetic trackers.
+
+For each size a workbook is generated (see make_tracker.py) and the app is
+started twice in a fresh interpreter: once with an empty cache directory
+(cold: the workbook is parsed) and once more against the cache the first run
+left behind (warm: the shared snapshot is attached). Each run reports the
+import and first-request time, peak RSS, and p50/p99 latency and throughput
+of /, /get_vessel_summary and /get_device_summary through Flask's test
+client, both with the response caches on and cleared before every request.
+
+Results are printed (or written with --output) as JSON, so runs on two
+revisions can be diffed.
+
+    python bench/run.py --sizes 1000 10000 100000 --output bench.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, ROOT)
+
+from make_tracker import make_tracker  # noqa: E402
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def peak_rss_kb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB on Linux
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def measure(call, count, before=None):
+    latencies = []
+    statuses = {}
+    start = time.perf_counter()
+    for i in range(count):
+        if before is not None:
+            before()
+        t = time.perf_counter()
+        status = call(i)
+        latencies.append(time.perf_counter() - t)
+        statuses[status] = statuses.get(status, 0) + 1
+    total = time.perf_counter() - start
+    return {
+        'requests': count,
+        'statuses': {str(k): v for k, v in statuses.items()},
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / count * 1000, 3),
+        'throughput_rps': round(count / total, 1),
+    }
+
+
+def worker(requests):
+    """Runs inside a fresh interpreter configured through the environment."""
+    t0 = time.perf_counter()
+    import app as webapp
+    import_s = time.perf_counter() - t0
+    client = webapp.app.test_client()
+    t = time.perf_counter()
+    status = client.get('/').status_code
+    first_request_s = time.perf_counter() - t
+
+    snap = webapp.store.current()
+    vessels = [name for name in snap.vessel_index if name in set(snap.devices['vessel'])] or ['']
+    devices = sorted(snap.device_index) or ['']
+
+    def clear_fragments():
+        webapp.fragment_cache.clear()
+
+    def clear_index():
+        webapp._index_pages.clear()
+
+    calls = {
+        '/': (lambda i: client.get('/').status_code, clear_index),
+        '/get_vessel_summary': (lambda i: client.post('/get_vessel_summary', json={'vesselName': vessels[i % len(vessels)]}).status_code, clear_fragments),
+        '/get_device_summary': (lambda i: client.post('/get_device_summary', json={'deviceName': devices[i % len(devices)]}).status_code, clear_fragments),
+    }
+    endpoints = {}
+    for path, (call, clear) in calls.items():
+        endpoints[path] = {
+            'cached': measure(call, requests),
+            'uncached': measure(call, requests, before=clear),
+        }
+    return {
+        'import_s': round(import_s, 4),
+        'first_request_s': round(first_request_s, 4),
+        'cold_start_s': round(import_s + first_request_s, 4),
+        'first_status': status,
+        'load': {'source': snap.info.get('source'), 'timings': snap.info.get('timings')},
+        'list_df_rows': len(snap.list_df),
+        'vessels': len(snap.vessel_index),
+        'device_rows': len(snap.devices),
+        'endpoints': endpoints,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def run_worker(workbook, cache_dir, requests):
+    env = dict(
+        os.environ,
+        SUSTAINABOS_WORKBOOK=workbook,
+        SUSTAINABOS_CACHE_DIR=cache_dir,
+        SUSTAINABOS_JOURNAL=os.path.join(cache_dir, 'journal.sqlite3'),
+        SUSTAINABOS_RELOAD_INTERVAL='0',
+        SUSTAINABOS_FLUSH_INTERVAL='0',
+    )
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', '--requests', str(requests)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    # Anything printed while the app loads comes first; the result is the last line
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def revision():
+    try:
+        rev = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return rev + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the app on synthetic trackers.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='Tracker rows per workbook')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and mode')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated workbooks and caches')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.requests)))
+        return
+
+    work_dir = tempfile.mkdtemp(prefix='sustainabos-bench-')
+    report = {
+        'revision': revision(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'requests': args.requests,
+        'results': [],
+    }
+    try:
+        for size in args.sizes:
+            workbook = os.path.join(work_dir, f'tracker-{size}.xlsx')
+            t = time.perf_counter()
+            vessels = make_tracker(workbook, size, args.seed)
+            generate_s = time.perf_counter() - t
+            cache_dir = os.path.join(work_dir, f'cache-{size}')
+            print(f'{size} rows: generated in {generate_s:.1f}s, benchmarking...', file=sys.stderr)
+            report['results'].append({
+                'rows': size,
+                'vessels': len(vessels),
+                'workbook_bytes': os.path.getsize(workbook),
+                'generate_s': round(generate_s, 3),
+                'cold': run_worker(workbook, cache_dir, args.requests),
+                'warm': run_worker(workbook, cache_dir, args.requests),
+            })
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
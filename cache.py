@@ -0,0 +1,78 @@
+"""
+Bounded in-memory LRU cache for rendered fragments.
+
+Entries are limited both by count and by total size (len() of the cached
+value, i.e. characters of HTML). Keys are expected to start with the data
+snapshot version, so a reload makes old entries unreachable; clear() drops
+them straight away.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, max_entries=512, max_size=8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = len(value)
+        if size > self.max_size:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._data[key] = value
+            self._size += size
+            while len(self._data) > self.max_entries or self._size > self.max_size:
+                _, evicted = self._data.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def get_or_render(self, key, render):
+        """Cached value for key, calling render() on a miss. None results are not cached."""
+        value = self.get(key)
+        if value is None:
+            value = render()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'size': self._size,
+                'max_entries': self.max_entries,
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,156 @@
+"""
+On-demand chart rendering.
+
+Charts are drawn from the current DataSnapshot the first time they are
+requested, never at import. matplotlib is only imported when a chart is
+actually drawn, and drawing happens on a single background worker thread
+so requests never render concurrently. Each PNG is written to disk under a
+name that includes the dataset and the workbook hash, so a chart is drawn
+once per data version and survives restarts.
+"""
+
+import glob
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from loader import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+CHART_DIR = os.path.join(CACHE_DIR, 'charts')
+
+# Bump when a chart's drawing code changes so cached PNGs are redrawn.
+CHART_FORMAT = 1
+
+CHARTS = {}
+
+
+def chart(name):
+    """Register fn(fig, snapshot) as the drawing function of a chart."""
+    def register(fn):
+        CHARTS[name] = fn
+        return fn
+    return register
+
+
+def _barh(ax, series, xlabel):
+    series = series.sort_values()
+    ax.barh([str(i) for i in series.index], series.to_numpy(), color='#4caf50')
+    ax.set_xlabel(xlabel)
+    ax.grid(axis='x', alpha=0.3)
+
+
+@chart('top_vessels')
+def _top_vessels(fig, snap):
+    savings = snap.aggregates.rollup('vessel').set_index('vessel')['total_savings']
+    ax = fig.add_subplot()
+    _barh(ax, savings[savings > 0].nlargest(10), 'Expected savings / year')
+    ax.set_title('Top vessels - Savings')
+
+
+@chart('top_devices')
+def _top_devices(fig, snap):
+    savings = snap.aggregates.rollup('device').set_index('device')['total_savings']
+    ax = fig.add_subplot()
+    _barh(ax, savings[savings > 0].nlargest(10), 'Expected savings / year')
+    ax.set_title('Top devices - Savings')
+
+
+@chart('co2_by_device')
+def _co2_by_device(fig, snap):
+    co2 = snap.aggregates.rollup('device').set_index('device')['co2_savings']
+    ax = fig.add_subplot()
+    _barh(ax, co2[co2 > 0], 'CO2 savings ton / year')
+    ax.set_title('CO2 savings by device')
+
+
+@chart('installation_progress')
+def _installation_progress(fig, snap):
+    devices = snap.devices
+    counts = devices.groupby(['device', 'status'], observed=True).size().unstack(fill_value=0)
+    statuses = [s for s in ('Done', 'In Process', 'Not Installed') if s in counts.columns]
+    counts = counts[statuses]
+    counts = counts[counts.sum(axis=1) > 0].sort_values(statuses[0] if statuses else counts.columns[0])
+    ax = fig.add_subplot()
+    left = None
+    colors = {'Done': '#4caf50', 'In Process': '#ffb300', 'Not Installed': '#e0e0e0'}
+    labels = [str(i) for i in counts.index]
+    for status in statuses:
+        values = counts[status].to_numpy()
+        ax.barh(labels, values, left=left, label=status, color=colors[status])
+        left = values if left is None else left + values
+    ax.set_xlabel('Vessels')
+    ax.legend(loc='lower right')
+    ax.set_title('Installation progress by device')
+
+
+class ChartRenderer:
+    """Renders registered charts to PNG files on a background thread."""
+
+    def __init__(self, directory=CHART_DIR, max_workers=1):
+        self.directory = directory
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='chart')
+        self._pending = {}
+        self._requested = set()
+        self._lock = threading.RLock()
+
+    def _prefix(self, name, snap):
+        # Dataset ids and chart names have no dots
+        return os.path.join(self.directory, f"{name}.{snap.info.get('dataset', 'default')}.")
+
+    def path_for(self, name, snap):
+        return f'{self._prefix(name, snap)}{snap.hash[:16]}-v{CHART_FORMAT}.png'
+
+    def get(self, name, snap):
+        """Future resolving to the PNG path of chart `name` for this snapshot."""
+        path = self.path_for(name, snap)
+        with self._lock:
+            self._requested.add(name)
+            future = self._pending.get(path)
+            if future is not None:
+                return future
+            if os.path.exists(path):
+                future = Future()
+                future.set_result(path)
+            else:
+                future = self._executor.submit(self._render, name, snap, path)
+                self._pending[path] = future
+                future.add_done_callback(lambda f: self._done(path))
+            return future
+
+    def refresh(self, snap):
+        """Redraw, in the background, the charts that have been asked for so far."""
+        with self._lock:
+            names = list(self._requested)
+        for name in names:
+            self.get(name, snap)
+
+    def _done(self, path):
+        with self._lock:
+            self._pending.pop(path, None)
+
+    def _render(self, name, snap, path):
+        if os.path.exists(path):
+            # Another worker process got there first
+            return path
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(9, 6))
+        CHARTS[name](fig, snap)
+        fig.tight_layout()
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        fig.savefig(tmp, format='png', dpi=100)
+        os.replace(tmp, path)
+        logger.info('Rendered chart %s for %r', name, snap)
+
+        # Drop the PNGs of the dataset's older data versions
+        for old in glob.glob(glob.escape(self._prefix(name, snap)) + '*.png'):
+            if old != path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+        return path
@@ -0,0 +1,257 @@
+"""
+Several tracker workbooks served side by side, one dataset per workbook.
+
+The dataset is picked per request by the id in the URL: /d/<dataset>/...
+serves the same routes as / for that dataset's workbook. DatasetPrefix moves
+the prefix from PATH_INFO to SCRIPT_NAME, so the routes stay as they are and
+url_for() keeps links inside the dataset. Unprefixed URLs serve the default
+dataset, the workbook the app has always been pointed at.
+
+Datasets are listed in SUSTAINABOS_DATASETS as comma separated id=path pairs,
+and every .xlsx file in SUSTAINABOS_DATASET_DIR is one too, named after the
+file. Each gets its own SnapshotStore, status journal and write-behind, but
+only the stores are loaded on demand: a dataset's tables are read the first
+time a request asks for it and kept in an LRU bounded by
+SUSTAINABOS_MAX_DATASETS loaded datasets and SUSTAINABOS_DATASET_MEMORY bytes
+of tables. Evicting one drops its store (requests holding its snapshot finish
+with it) and stops its watcher; the next request loads it again, usually by
+attaching the shared snapshot instead of parsing the workbook (see shared.py).
+The default dataset is never evicted.
+"""
+
+import functools
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from journal import JOURNAL_PATH, StatusJournal
+from snapshot import SnapshotStore
+from writeback import WriteBehind
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASET = os.environ.get('SUSTAINABOS_DEFAULT_DATASET', 'default')
+MAX_LOADED = int(os.environ.get('SUSTAINABOS_MAX_DATASETS', '8'))
+MAX_MEMORY = int(os.environ.get('SUSTAINABOS_DATASET_MEMORY', str(512 * 1024 * 1024)))
+
+# WSGI environ key holding the dataset id taken from the URL
+ENVIRON_KEY = 'sustainabos.dataset'
+URL_PREFIX = '/d/'
+
+_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def dataset_id(name):
+    """A URL-safe dataset id from a file name: 'Tracker 2025 (NV).xlsx' -> 'Tracker_2025_NV'."""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return re.sub(r'_+', '_', re.sub(r'[^A-Za-z0-9_-]', '_', stem)).strip('_')
+
+
+def configured_paths(default_path, spec=None, directory=None, default=DEFAULT_DATASET):
+    """
+    {dataset id: workbook path}: the default workbook, then the id=path pairs
+    of spec (SUSTAINABOS_DATASETS), then the .xlsx files of directory
+    (SUSTAINABOS_DATASET_DIR). The first entry for an id wins.
+    """
+    spec = os.environ.get('SUSTAINABOS_DATASETS', '') if spec is None else spec
+    directory = os.environ.get('SUSTAINABOS_DATASET_DIR') if directory is None else directory
+    paths = {default: default_path}
+    for entry in spec.split(','):
+        if not entry.strip():
+            continue
+        name, sep, path = entry.partition('=')
+        name = name.strip()
+        if not sep or not _ID.match(name):
+            raise ValueError(f'SUSTAINABOS_DATASETS entries are id=path with ids of letters, digits, - and _, got {entry!r}')
+        paths.setdefault(name, path.strip())
+    if directory:
+        for filename in sorted(os.listdir(directory)):
+            if filename.lower().endswith('.xlsx') and not filename.startswith('~$'):
+                name = dataset_id(filename)
+                if name:
+                    paths.setdefault(name, os.path.join(directory, filename))
+    return paths
+
+
+def journal_path(name, default=DEFAULT_DATASET):
+    # The default dataset keeps the journal it always had, the others get one beside it
+    if name == default:
+        return JOURNAL_PATH
+    root, ext = os.path.splitext(JOURNAL_PATH)
+    return f'{root}-{name}{ext}'
+
+
+def memory_usage(snapshot):
+    """Bytes held by a snapshot's tables and device rows (deep, so object columns count in full)."""
+    frames = list(snapshot.tables.values())
+    if 'devices' not in snapshot.tables:
+        frames.append(snapshot.devices)
+    return int(sum(frame.memory_usage(index=True, deep=True).sum() for frame in frames))
+
+
+class Dataset:
+    """One workbook: its store while loaded, and its journal and write-behind for good."""
+
+    def __init__(self, name, path, journal_path):
+        self.id = name
+        self.path = path
+        self.journal_path = journal_path
+        self.store = None
+        self.size = 0
+        self.timings = None
+        self.last_edit_sync = 0.0
+
+    @functools.cached_property
+    def journal(self):
+        return StatusJournal(self.journal_path)
+
+    @functools.cached_property
+    def write_behind(self):
+        # Kept across evictions: pending edits of an evicted dataset still get written
+        return WriteBehind(self.journal, self.path)
+
+    def __repr__(self):
+        return f'<Dataset {self.id} {self.path!r}>'
+
+
+class DatasetRegistry:
+    def __init__(self, paths, default=DEFAULT_DATASET, max_loaded=MAX_LOADED, max_memory=MAX_MEMORY):
+        if default not in paths:
+            raise ValueError(f'No workbook for the default dataset {default!r}')
+        self.datasets = {name: Dataset(name, path, journal_path(name, default)) for name, path in paths.items()}
+        self.default = default
+        self.max_loaded = max_loaded
+        self.max_memory = max_memory
+        self._loaded = OrderedDict()  # id -> Dataset, least recently used first
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._overlays = []
+        self.loads = 0
+        self.evictions = 0
+
+    def on_load(self, callback):
+        """Call callback(snapshot) after every swap in any dataset (see SnapshotStore.on_load)."""
+        self._listeners.append(callback)
+        for store in self._stores():
+            store.on_load(callback)
+        return callback
+
+    def add_overlay(self, overlay):
+        """Pass every snapshot loaded for a dataset through overlay(dataset, snapshot) -> snapshot."""
+        self._overlays.append(overlay)
+        for dataset in self.datasets.values():
+            if dataset.store is not None:
+                dataset.store.add_overlay(functools.partial(overlay, dataset))
+        return overlay
+
+    def __contains__(self, name):
+        return name in self.datasets
+
+    def get(self, name=None):
+        """The Dataset called name, the default one for None. KeyError for unknown ids."""
+        return self.datasets[self.default if name is None else name]
+
+    def store(self, name=None):
+        """The dataset's SnapshotStore, opened (not yet loaded) if it was evicted or never used."""
+        dataset = self.get(name)
+        with self._lock:
+            store = dataset.store
+            if store is None:
+                store = dataset.store = self._open(dataset)
+            self._loaded[dataset.id] = dataset
+            self._loaded.move_to_end(dataset.id)
+        return store
+
+    def _stores(self):
+        return [dataset.store for dataset in self.datasets.values() if dataset.store is not None]
+
+    def _open(self, dataset):
+        store = SnapshotStore(dataset.path)
+        store.add_overlay(functools.partial(self._tag, dataset))
+        for overlay in self._overlays:
+            store.add_overlay(functools.partial(overlay, dataset))
+        store.on_load(functools.partial(self._record, dataset, store))
+        for callback in self._listeners:
+            store.on_load(callback)
+        return store
+
+    def _tag(self, dataset, snapshot):
+        snapshot.info['dataset'] = dataset.id
+        return snapshot
+
+    def _record(self, dataset, store, snapshot):
+        # Size new loads, then evict other datasets until the limits hold again.
+        # Status edits copy info but keep the timings (and most tables) of their load
+        timings = snapshot.info.get('timings')
+        if timings is not None and timings is dataset.timings:
+            return
+        size = memory_usage(snapshot)
+        with self._lock:
+            if dataset.store is not store:
+                # Evicted while it was loading
+                return
+            dataset.timings = timings
+            dataset.size = size
+            self.loads += 1
+            evicted = self._evict(keep=dataset)
+        for other, size in evicted:
+            logger.info('Evicted dataset %s (%d bytes)', other.id, size)
+
+    def _evict(self, keep):
+        # Least recently used first; the default dataset and the one just loaded stay
+        evicted = []
+        candidates = [d for d in self._loaded.values() if d is not keep and d.id != self.default]
+        while candidates and (len(self._loaded) > self.max_loaded or self.memory() > self.max_memory):
+            dataset = candidates.pop(0)
+            del self._loaded[dataset.id]
+            dataset.store.close()
+            evicted.append((dataset, dataset.size))
+            dataset.store = None
+            dataset.timings = None
+            dataset.size = 0
+            self.evictions += 1
+        return evicted
+
+    def memory(self):
+        return sum(dataset.size for dataset in self._loaded.values())
+
+    def is_current(self, snapshot):
+        """Whether snapshot is still the one served for its dataset (False once it was evicted)."""
+        dataset = self.datasets.get(snapshot.info.get('dataset'))
+        store = dataset.store if dataset is not None else None
+        return store is not None and store.current() is snapshot
+
+    def stats(self):
+        with self._lock:
+            loaded = list(self._loaded)
+            return {
+                'default': self.default,
+                'datasets': {name: {'loaded': name in self._loaded, 'size': dataset.size} for name, dataset in self.datasets.items()},
+                'lru': loaded,
+                'memory': self.memory(),
+                'max_loaded': self.max_loaded,
+                'max_memory': self.max_memory,
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
+
+
+class DatasetPrefix:
+    """
+    WSGI middleware serving /d/<dataset>/<path> as /<path> with the dataset id
+    in environ[ENVIRON_KEY] and the prefix appended to SCRIPT_NAME.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path.startswith(URL_PREFIX):
+            name, _, rest = path[len(URL_PREFIX):].partition('/')
+            environ[ENVIRON_KEY] = name
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + URL_PREFIX + name
+            environ['PATH_INFO'] = '/' + rest
+        return self.app(environ, start_response)
@@ -0,0 +1,139 @@
+"""
+Streaming export of the tracker's device rows as CSV, NDJSON or XLSX.
+
+Rows come from DataSnapshot.devices, one per vessel/device pair with the
+vessel name and spec filled in. They are converted and sent CHUNK_ROWS at a
+time from a generator, so memory stays flat whatever the size of the
+tracker and the first bytes go out before the last rows are converted.
+
+XLSX is written with openpyxl's write-only workbook, which keeps the sheet in
+a temporary file rather than in memory. A zip can only be finished once all
+of its entries are written, so the file is streamed once it is complete.
+"""
+
+import csv
+import datetime
+import io
+import json
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ('vessel', 'spec', 'device', 'status', 'installed_at', 'fuel_savings', 'maintenance_savings', 'co2_savings')
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+CHUNK_ROWS = 1000
+# Bytes per chunk when streaming a finished XLSX file
+FILE_CHUNK = 64 * 1024
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_columns(values):
+    """Columns from comma separated ?columns= values, in the order given; all of them if none."""
+    columns = [v.strip() for value in values for v in value.split(',') if v.strip()]
+    if not columns:
+        return list(COLUMNS)
+    unknown = [c for c in columns if c not in COLUMNS]
+    if unknown:
+        raise ExportError(f"Unknown column(s): {', '.join(unknown)}. Columns are: {', '.join(COLUMNS)}")
+    return list(dict.fromkeys(columns))
+
+
+def parse_date(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f'{name} must be a date as YYYY-MM-DD') from None
+
+
+def select(devices, vessel=(), device=(), status=(), since=None, until=None):
+    """
+    Positions of the device rows matching every filter: vessel name prefixes
+    (case-insensitive), device names and statuses (any of each), and an
+    inclusive installation date range, which leaves out rows without a date.
+    """
+    mask = np.ones(len(devices), dtype=bool)
+    if vessel:
+        prefixes = tuple(v.lower() for v in vessel)
+        mask &= devices['vessel'].astype(str).str.lower().str.startswith(prefixes).to_numpy()
+    if device:
+        mask &= devices['device'].isin(device).to_numpy()
+    if status:
+        mask &= devices['status'].isin(status).to_numpy()
+    if since is not None:
+        mask &= (devices['installed_at'] >= pd.Timestamp(since)).to_numpy()
+    if until is not None:
+        mask &= (devices['installed_at'] < pd.Timestamp(until) + pd.Timedelta(days=1)).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def _values(series):
+    # Python values of a column chunk: None for missing, dates for datetimes
+    missing = series.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        values = [None if m else ts.date() for ts, m in zip(series, missing)]
+    else:
+        values = series.to_numpy(dtype=object)
+        values = [None if m else (v.item() if isinstance(v, np.generic) else v) for v, m in zip(values, missing)]
+    return values
+
+
+def chunks(devices, positions, columns):
+    """Lists of row tuples, CHUNK_ROWS rows at a time."""
+    frame = devices[columns]
+    for start in range(0, len(positions), CHUNK_ROWS):
+        block = frame.iloc[positions[start:start + CHUNK_ROWS]]
+        yield list(zip(*(_values(block[column]) for column in columns)))
+
+
+def _text(value):
+    return value.isoformat() if isinstance(value, datetime.date) else value
+
+
+def stream_csv(devices, positions, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks(devices, positions, columns):
+        writer.writerows([['' if v is None else _text(v) for v in row] for row in rows])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header of an empty export
+        yield buffer.getvalue()
+
+
+def stream_ndjson(devices, positions, columns):
+    for rows in chunks(devices, positions, columns):
+        yield ''.join(json.dumps(dict(zip(columns, map(_text, row))), ensure_ascii=False) + '\n' for row in rows)
+
+
+def stream_xlsx(devices, positions, columns):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Tracker')
+    ws.append(columns)
+    for rows in chunks(devices, positions, columns):
+        for row in rows:
+            ws.append(row)
+    with tempfile.TemporaryFile() as f:
+        wb.save(f)
+        f.seek(0)
+        for data in iter(lambda: f.read(FILE_CHUNK), b''):
+            yield data
+
+
+STREAMS = {'csv': stream_csv, 'ndjson': stream_ndjson, 'xlsx': stream_xlsx}
@@ -0,0 +1,173 @@
+"""
+Resized, recompressed derivatives of the static images.
+
+Most images under static/ are photos and screenshots of 1000-2000 px (up to
+1.4 MB) shown at a few hundred pixels. ImagePipeline makes WebP (and AVIF
+when a Pillow AVIF plugin is installed) copies at a fixed ladder of widths,
+on first request, and keeps them on disk named after the source file's hash,
+so they are made once per image version and survive restarts.
+
+The variant served is the smallest ladder width covering the requested one
+(never wider than the source), in the best format the browser's Accept
+header allows. Browsers that take neither get a resized copy in the source
+format.
+"""
+
+import glob
+import logging
+import os
+import re
+import threading
+
+from PIL import Image
+
+from loader import CACHE_DIR, file_hash
+
+try:  # AVIF encoding needs a plugin on Pillow < 11.2
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DIR = os.path.join(CACHE_DIR, 'images')
+
+WIDTHS = (64, 128, 192, 256, 512, 960, 1440)
+
+# Bump when the encoding settings change so cached derivatives are redone.
+IMAGE_FORMAT = 1
+
+# Best first. Saved with these Pillow format names and options
+ENCODINGS = {
+    'avif': ('AVIF', 'image/avif', {'quality': 60}),
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 6}),
+    'png': ('PNG', 'image/png', {'optimize': True}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+Image.init()  # registers the encoders listed in Image.SAVE
+MODERN_FORMATS = tuple(name for name in ('avif', 'webp') if ENCODINGS[name][0] in Image.SAVE)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.ico', '.gif')
+
+
+class ImageSource:
+    """Size and content hash of one source image."""
+
+    def __init__(self, path, stamp):
+        self.path = path
+        self.stamp = stamp
+        self.digest = file_hash(path)
+        with Image.open(path) as im:
+            self.size = im.size
+            # Fallback format for browsers without WebP: keep transparency as PNG
+            self.fallback = 'jpeg' if im.mode in ('RGB', 'L', 'CMYK') else 'png'
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    def widths(self, max_width=None):
+        """Ladder widths this image can be served at (plus its own width when smaller)."""
+        limit = min(self.width, max_width or self.width)
+        widths = [w for w in WIDTHS if w < limit]
+        return widths + [limit]
+
+
+class ImagePipeline:
+    def __init__(self, static_dir, directory=IMAGE_DIR):
+        self.static_dir = os.path.abspath(static_dir)
+        self.directory = directory
+        self._sources = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def source(self, filename):
+        """ImageSource for a file under static/, or None if it isn't an image there."""
+        path = os.path.abspath(os.path.join(self.static_dir, filename))
+        if not path.startswith(self.static_dir + os.sep) or not path.lower().endswith(IMAGE_EXTENSIONS):
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self._sources.get(path)
+        if cached is None or cached.stamp != stamp:
+            try:
+                cached = self._sources[path] = ImageSource(path, stamp)
+            except OSError:
+                return None
+        return cached
+
+    @staticmethod
+    def choose_width(source, requested):
+        if not requested:
+            return source.width
+        for width in source.widths():
+            if width >= requested:
+                return width
+        return source.width
+
+    @staticmethod
+    def choose_format(source, accept, requested=None):
+        """Pick an encoding from an explicit request or the Accept header."""
+        if requested in ENCODINGS and ENCODINGS[requested][0] in Image.SAVE:
+            return requested
+        accept = accept or ''
+        for name in MODERN_FORMATS:
+            if ENCODINGS[name][1] in accept:
+                return name
+        return source.fallback
+
+    def _stem(self, source):
+        return os.path.splitext(os.path.relpath(source.path, self.static_dir))[0].replace(os.sep, '_')
+
+    def path_for(self, source, width, fmt):
+        return os.path.join(self.directory, f'{self._stem(source)}-{source.digest[:16]}-{width}-v{IMAGE_FORMAT}.{fmt}')
+
+    def variant(self, source, width, fmt):
+        """Path of source at width in fmt, encoding it first if needed."""
+        path = self.path_for(source, width, fmt)
+        if os.path.exists(path):
+            return path
+        with self._lock:
+            lock = self._locks.setdefault(path, threading.Lock())
+        with lock:
+            if not os.path.exists(path):
+                self._encode(source, width, fmt, path)
+        with self._lock:
+            self._locks.pop(path, None)
+        return path
+
+    def _encode(self, source, width, fmt, path):
+        pil_format, _, options = ENCODINGS[fmt]
+        with Image.open(source.path) as im:
+            if im.format == 'ICO':
+                # Use the largest icon in the file
+                im.size = max(im.info.get('sizes') or [im.size])
+            im.load()
+            im = im.convert('RGBA' if im.mode in ('P', 'LA', 'RGBA', 'PA') or 'transparency' in im.info else 'RGB')
+            if im.width > width:
+                im = im.resize((width, max(1, round(im.height * width / im.width))), Image.LANCZOS)
+            if pil_format == 'JPEG' and im.mode == 'RGBA':
+                im = im.convert('RGB')
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            im.save(tmp, format=pil_format, **options)
+        os.replace(tmp, path)
+        logger.info('Encoded %s at %dpx as %s', source.path, width, fmt)
+
+        # Drop derivatives of older versions of this image
+        stem = self._stem(source)
+        pattern = re.compile(re.escape(stem) + r'-([0-9a-f]{16})-\d+-v\d+\.\w+$')
+        for old in glob.glob(os.path.join(glob.escape(self.directory), glob.escape(stem) + '-*')):
+            m = pattern.match(os.path.basename(old))
+            if m and m.group(1) != source.digest[:16]:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def mimetype(fmt):
+        return ENCODINGS[fmt][1]
@@ -0,0 +1,179 @@
+"""
+Lookup indexes and tables derived from the Tracker sheet (list_df).
+
+list_df is laid out in vessel blocks: a header row with the vessel number in
+the "N" column and the vessel name next to it, followed by one row per
+device with an empty "N". The indexes here are built with vectorised
+operations once per data load so the routes never have to walk the sheet
+row by row. Rebuild them whenever list_df changes.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def build_vessel_index(list_df):
+    """Map each vessel name to the (start, end) row span of its block in list_df."""
+    if list_df.empty:
+        return {}
+    n_filled = list_df.iloc[:, 0].notna().to_numpy()
+    names = list_df.iloc[:, 1]
+    name_rows = np.flatnonzero(names.notna().to_numpy())
+
+    # A block runs until the next row with a filled "N" cell (or the end)
+    block_starts = np.append(np.flatnonzero(n_filled), len(list_df))
+    ends = block_starts[np.searchsorted(block_starts, name_rows, side='right')]
+
+    index = {}
+    for name, start, end in zip(names.to_numpy()[name_rows], name_rows.tolist(), ends.tolist()):
+        # First occurrence wins, as the old row-scanning lookup did
+        index.setdefault(name, (start, end))
+    return index
+
+
+def build_vessel_owner(list_df):
+    """Owning vessel name for every row of list_df (the vessel column forward-filled, categorical when typed)."""
+    return list_df.iloc[:, 1].ffill().array
+
+
+def build_device_index(list_df):
+    """
+    Inverted index of device rows: {device: {status: row positions}}.
+
+    Positions are sorted numpy arrays into list_df. Rows without a status are
+    kept under the None key.
+    """
+    if list_df.empty:
+        return {}
+    keys = [list_df.iloc[:, 3].rename('device'), list_df.iloc[:, 4].rename('status')]
+    index = {}
+    for (device, status), positions in list_df.groupby(keys, dropna=False, sort=False, observed=True).indices.items():
+        if pd.isna(device):
+            continue
+        index.setdefault(device, {})[None if pd.isna(status) else status] = positions
+    return index
+
+
+def updated_device_index(index, moves):
+    """
+    A build_device_index result with rows moved between statuses, for moves of
+    (device, position, old status, new status). Only the entries of the moved
+    devices are copied; statuses are None for rows without one.
+    """
+    index = dict(index)
+    copied = set()
+    for device, position, old, new in moves:
+        if old == new:
+            continue
+        if device not in copied:
+            index[device] = dict(index.get(device, {}))
+            copied.add(device)
+        by_status = index[device]
+        if old in by_status:
+            rest = by_status[old][by_status[old] != position]
+            if len(rest):
+                by_status[old] = rest
+            else:
+                del by_status[old]
+        positions = by_status.get(new, np.empty(0, dtype=np.intp))
+        by_status[new] = np.insert(positions, np.searchsorted(positions, position), position)
+    return index
+
+
+def device_positions(device_index, device_name, statuses=None):
+    """Sorted list_df positions for a device, limited to the given statuses (None = all)."""
+    by_status = device_index.get(device_name)
+    if not by_status:
+        return np.empty(0, dtype=np.intp)
+    parts = [p for s, p in by_status.items() if statuses is None or s in statuses]
+    if not parts:
+        return np.empty(0, dtype=np.intp)
+    return np.sort(np.concatenate(parts))
+
+
+DEVICE_COLUMNS = ['vessel', 'spec', 'device', 'status', 'installed', 'installed_at', 'fuel_savings', 'maintenance_savings', 'co2_savings']
+
+
+def parse_install_dates(values):
+    """
+    Datetimes for the free-form "Date of Installation" cells: real dates are
+    kept, text like '23-Feb. 2025' or '04 Nov.2020' is parsed day first, and
+    anything else becomes NaT.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy()
+    result = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    is_text = values.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    is_date = values.map(lambda v: hasattr(v, 'year') and not isinstance(v, str)).to_numpy(dtype=bool)
+    if is_date.any():
+        result[is_date] = pd.to_datetime(values[is_date], errors='coerce')
+    if is_text.any():
+        text = values[is_text].str.replace('.', ' ', regex=False)
+        result[is_text] = pd.to_datetime(text, errors='coerce', format='mixed', dayfirst=True)
+    return result.to_numpy()
+
+
+def install_dates(column):
+    """parse_install_dates for a list_df column, parsing each distinct value once when it is categorical."""
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        return parse_install_dates(column.to_numpy())
+    parsed = parse_install_dates(np.asarray(column.cat.categories, dtype=object))
+    codes = column.cat.codes.to_numpy()
+    result = np.full(len(codes), np.datetime64('NaT'), dtype='datetime64[ns]')
+    result[codes >= 0] = parsed[codes[codes >= 0]]
+    return result
+
+
+def build_device_rows(list_df, vessel_owner):
+    """
+    One row per vessel/device pair with the owning vessel and spec filled in and
+    the savings columns coerced to numbers. The index keeps list_df positions.
+    Text columns stay categorical when list_df has them typed; installed is
+    the cell as written and installed_at its parsed date.
+    """
+    if list_df.empty:
+        return pd.DataFrame(columns=DEVICE_COLUMNS)
+    rows = list_df.iloc[:, 0].isna().to_numpy() & list_df.iloc[:, 3].notna().to_numpy()
+    positions = np.flatnonzero(rows)
+    block = list_df.iloc[positions]
+    devices = pd.DataFrame({
+        'vessel': vessel_owner[positions],
+        'spec': list_df.iloc[:, 2].ffill().array[positions],
+        'device': block.iloc[:, 3].array,
+        'status': block.iloc[:, 4].array,
+        'installed': block.iloc[:, 5].array,
+        'installed_at': install_dates(block.iloc[:, 5]),
+        'fuel_savings': pd.to_numeric(block.iloc[:, 6], errors='coerce').to_numpy(),
+        'maintenance_savings': pd.to_numeric(block.iloc[:, 7], errors='coerce').to_numpy(),
+        'co2_savings': pd.to_numeric(block.iloc[:, 8], errors='coerce').to_numpy(),
+    }, index=positions)
+    return devices
+
+
+def updated_device_rows(devices, list_df, positions):
+    """
+    build_device_rows for a list_df that differs from the one devices was
+    built from only in the status and installation date of the rows at
+    positions (status edits). Only those rows are read again; the other
+    columns are shared with devices.
+    """
+    rows = devices.index.get_indexer(list(dict.fromkeys(positions)))
+    rows = rows[rows >= 0]
+    devices = devices.copy(deep=False)
+    if not len(rows):
+        return devices
+    changed = devices.index.to_numpy()[rows]
+    for name, column in (('status', 4), ('installed', 5)):
+        source = list_df.iloc[:, column].array
+        values = devices[name].array
+        if isinstance(source, pd.Categorical):
+            values = values.set_categories(source.categories)
+        else:
+            values = values.copy()
+        values[rows] = source[changed]
+        devices[name] = values
+    installed_at = devices['installed_at'].to_numpy().copy()
+    installed_at[rows] = parse_install_dates(np.asarray(devices['installed'].array[rows], dtype=object))
+    devices['installed_at'] = installed_at
+    return devices
@@ -0,0 +1,181 @@
+"""
+Append-only journal of installation status edits.
+
+Edits coming from the "Modify Status" form are appended to a SQLite database
+in WAL mode that every gunicorn worker shares. An edit is durable as soon as
+append() returns, long before it reaches the workbook: writeback.py copies
+pending edits into the xlsx in batches, and each worker layers the edits its
+snapshot does not contain yet on top of it (apply_edits).
+
+Edits address a device row by (vessel, device) rather than by sheet row, and
+applying one is idempotent, so replaying an edit the workbook already holds
+does no harm.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from indexes import updated_device_index, updated_device_rows
+from snapshot import DataSnapshot
+
+JOURNAL_PATH = os.environ.get('SUSTAINABOS_JOURNAL', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'status_journal.sqlite3'))
+
+# Values offered by the Installation Status dropdown of the Tracker sheet
+STATUS_CHOICES = ('Not Installed', 'In Process', 'Done', 'No Need')
+
+# list_df columns written by an edit, and the device column that locates it
+DEVICE_COLUMN = 3
+STATUS_COLUMN = 4
+DATE_COLUMN = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS edits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    vessel TEXT NOT NULL,
+    device TEXT NOT NULL,
+    status TEXT NOT NULL,
+    installed TEXT
+);
+CREATE TABLE IF NOT EXISTS flushes (
+    workbook_hash TEXT PRIMARY KEY,
+    last_edit_id INTEGER NOT NULL,
+    ts REAL NOT NULL
+);
+"""
+
+
+class StatusJournal:
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def append(self, vessel, device, status, installed=None):
+        """Record an edit durably and return it as a dict."""
+        ts = time.time()
+        cur = self._conn().execute(
+            'INSERT INTO edits (ts, vessel, device, status, installed) VALUES (?, ?, ?, ?, ?)',
+            (ts, vessel, device, status, installed),
+        )
+        return {'id': cur.lastrowid, 'ts': ts, 'vessel': vessel, 'device': device, 'status': status, 'installed': installed}
+
+    def last_id(self):
+        return self._conn().execute('SELECT COALESCE(MAX(id), 0) FROM edits').fetchone()[0]
+
+    def edits_since(self, edit_id, until=None):
+        sql = 'SELECT * FROM edits WHERE id > ?'
+        args = [edit_id]
+        if until is not None:
+            sql += ' AND id <= ?'
+            args.append(until)
+        return [dict(row) for row in self._conn().execute(sql + ' ORDER BY id', args)]
+
+    def flushed_through(self, workbook_hash=None):
+        """
+        Last edit id already contained in the workbook with this hash. For a
+        workbook we did not write ourselves, every edit flushed so far.
+        """
+        conn = self._conn()
+        if workbook_hash is not None:
+            row = conn.execute('SELECT last_edit_id FROM flushes WHERE workbook_hash = ?', (workbook_hash,)).fetchone()
+            if row is not None:
+                return row[0]
+        return conn.execute('SELECT COALESCE(MAX(last_edit_id), 0) FROM flushes').fetchone()[0]
+
+    def pending(self):
+        """Edits not written back to the workbook yet."""
+        return self.edits_since(self.flushed_through())
+
+    def record_flush(self, workbook_hash, last_edit_id):
+        self._conn().execute(
+            'INSERT OR REPLACE INTO flushes (workbook_hash, last_edit_id, ts) VALUES (?, ?, ?)',
+            (workbook_hash, last_edit_id, time.time()),
+        )
+
+
+def locate_device_row(snap, vessel, device):
+    """Position in list_df of a vessel's device row, or None."""
+    span = snap.vessel_index.get(vessel)
+    if span is None:
+        return None
+    start, end = span
+    devices = snap.list_df.iloc[start + 1:end, 3]
+    matches = (devices == device).to_numpy().nonzero()[0]
+    if len(matches) == 0:
+        return None
+    return start + 1 + int(matches[0])
+
+
+def apply_edits(snap, edits):
+    """
+    New DataSnapshot with the edits written into list_df. Returns snap itself
+    if there are none. Edits only change statuses and dates, so the edited
+    rows are patched into copies of those two columns, the device rows and
+    the device index; everything else is shared with snap.
+    """
+    if not edits:
+        return snap
+    list_df = snap.list_df.copy(deep=False)
+    for column, key in ((STATUS_COLUMN, 'status'), (DATE_COLUMN, 'installed')):
+        values = list_df.iloc[:, column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # A typed column only takes values it has a category for
+            new = list(dict.fromkeys(edit[key] for edit in edits if edit.get(key) and edit[key] not in values.cat.categories))
+            values = values.cat.add_categories(new) if new else values.copy()
+        else:
+            values = values.copy()
+        list_df.isetitem(column, values)
+    positions = []
+    for edit in edits:
+        pos = locate_device_row(snap, edit['vessel'], edit['device'])
+        if pos is None:
+            # The vessel or device has since been removed from the workbook
+            continue
+        positions.append(pos)
+        list_df.iat[pos, STATUS_COLUMN] = edit['status']
+        if edit.get('installed'):
+            # As typed, like the sheet's own cells; the device rows parse it
+            list_df.iat[pos, DATE_COLUMN] = edit['installed']
+
+    def status(statuses, pos):
+        value = statuses.iat[pos]
+        return None if pd.isna(value) else value
+
+    old_statuses = snap.list_df.iloc[:, STATUS_COLUMN]
+    new_statuses = list_df.iloc[:, STATUS_COLUMN]
+    devices = list_df.iloc[:, DEVICE_COLUMN]
+    moves = [(devices.iat[pos], pos, status(old_statuses, pos), status(new_statuses, pos)) for pos in dict.fromkeys(positions)]
+
+    tables = dict(snap.tables, list_df=list_df, devices=updated_device_rows(snap.devices, list_df, positions))
+    last = edits[-1]
+    info = dict(snap.info, mtime=max(snap.info['mtime'], last['ts']))
+    content_hash = hashlib.sha256(f"{snap.source_hash}:{last['id']}".encode('ascii')).hexdigest()
+    edited = DataSnapshot(tables, info, content_hash=content_hash, edit_id=last['id'], vessel_index=snap.vessel_index,
+                          vessel_owner=snap.vessel_owner, device_index=updated_device_index(snap.device_index, moves))
+    if 'search_index' in vars(snap):
+        # Names and specs only, which edits don't change
+        edited.search_index = snap.search_index
+    if 'timeline' in vars(snap):
+        # Move the savings of the edited rows only instead of rebuilding every series
+        edited.timeline = snap.timeline.updated(edited.devices, positions)
+    return edited
@@ -0,0 +1,239 @@
+"""
+Workbook loader for the SustainaBOS tracker.
+
+The app used to call pd.read_excel once per table, which re-opened and
+re-parsed the whole workbook every time. This module opens the workbook a
+single time in openpyxl's streaming read-only mode, reads each sheet once
+and slices every table out of those rows with the same parser pandas uses
+for read_excel, so the resulting DataFrames are identical.
+
+The parsed tables are also published as a columnar snapshot named after
+the SHA-256 of the workbook contents (see shared.py). A later boot, or
+another worker, with an unchanged workbook maps that snapshot and skips
+Excel parsing altogether.
+
+The Tracker table is typed and sized by its schema (see schema.py) rather
+than read as a fixed number of generic object rows. Its device rows
+(indexes.build_device_rows, with the parsed installation dates) are built
+once here and published with the tables, so workers attaching the snapshot
+map them instead of rebuilding them.
+"""
+
+import hashlib
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+import shared
+from indexes import build_device_rows, build_vessel_owner
+from schema import TRACKER_SCHEMA, coerce
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get('SUSTAINABOS_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+
+# name -> (sheet, read_excel style options).
+# Tables without nrows run to the end of the sheet, or to the first blank row
+# after their first value with extent='block'; a schema types the columns.
+TABLES = {
+    'list_df': ('Tracker', dict(skiprows=7, usecols='B:J', schema=TRACKER_SCHEMA)),
+    'summary_df': ('Summary', dict(skiprows=0, nrows=13, usecols='A:F')),
+    'summary2_df': ('Summary', dict(skiprows=15, nrows=3, usecols='B:C')),
+    'summary3_df': ('Summary', dict(skiprows=0, nrows=4, usecols='I:K')),
+    'listvessel_df': ('Summary', dict(skiprows=21, usecols='A', extent='block')),
+    'listdevice_df': ('Summary', dict(skiprows=1, nrows=12, usecols='A')),
+}
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _column_range(spec):
+    # "B:J" -> [1, ..., 9], "A" -> [0]
+    from openpyxl.utils import column_index_from_string
+    cols = []
+    for part in spec.split(','):
+        first, _, last = part.strip().partition(':')
+        start = column_index_from_string(first) - 1
+        stop = column_index_from_string(last or first)
+        cols.extend(range(start, stop))
+    return cols
+
+
+def _convert_cell(cell):
+    # Same conversion pandas applies to openpyxl cells
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+    if cell.value is None:
+        return ''
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        val = int(cell.value)
+        if val == cell.value:
+            return val
+        return float(cell.value)
+    return cell.value
+
+
+def _sheet_rows(sheet, rows_needed=None):
+    sheet.reset_dimensions()
+    data = []
+    last_row_with_data = -1
+    for row_number, row in enumerate(sheet.rows):
+        converted = [_convert_cell(cell) for cell in row]
+        while converted and converted[-1] == '':
+            converted.pop()
+        if converted:
+            last_row_with_data = row_number
+        data.append(converted)
+        if rows_needed is not None and len(data) >= rows_needed:
+            break
+    data = data[:last_row_with_data + 1]
+    if data:
+        width = max(len(r) for r in data)
+        data = [r + [''] * (width - len(r)) for r in data]
+    return data
+
+
+def _rows_needed(options):
+    if options.get('nrows') is None:
+        return None
+    return options.get('skiprows', 0) + 1 + options['nrows']
+
+
+def _parse_table(data, options):
+    # read_excel only looks at the rows it needs, so trailing blank rows are
+    # trimmed relative to that window rather than to the whole sheet
+    rows = _rows_needed(options)
+    if rows is not None and rows < len(data):
+        data = data[:rows]
+        while data and all(v == '' for v in data[-1]):
+            data.pop()
+    if not data:
+        return pd.DataFrame()
+    parser = TextParser(
+        data,
+        names=options.get('names'),
+        header=0,
+        skiprows=options.get('skiprows'),
+        nrows=options.get('nrows'),
+        usecols=_column_range(options['usecols']),
+        skip_blank_lines=False,
+    )
+    try:
+        frame = parser.read(nrows=options.get('nrows'))
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+    if options.get('extent') == 'block':
+        filled = frame.notna().any(axis=1).to_numpy()
+        if filled.any():
+            start = int(filled.argmax())
+            gaps = np.flatnonzero(~filled[start:])
+            if len(gaps):
+                frame = frame.iloc[:start + gaps[0]]
+    return frame
+
+
+def parse_workbook(path, tables=TABLES):
+    """
+    Read every table from the workbook in one pass. Returns ({name: DataFrame},
+    {name: coercion report}) with a report for each table that has a schema.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        # Work out how many rows each sheet has to be read for, then read it once
+        needed = {}
+        for sheet, options in tables.values():
+            name = wb.sheetnames[sheet] if isinstance(sheet, int) else sheet
+            rows = _rows_needed(options)
+            if name not in needed:
+                needed[name] = rows
+            elif needed[name] is not None:
+                needed[name] = None if rows is None else max(needed[name], rows)
+        sheets = {name: _sheet_rows(wb[name], rows) for name, rows in needed.items()}
+    finally:
+        wb.close()
+
+    result = {}
+    reports = {}
+    for table, (sheet, options) in tables.items():
+        name = wb.sheetnames[sheet] if isinstance(sheet, int) else sheet
+        result[table] = _parse_table(sheets[name], options)
+        if options.get('schema'):
+            # First data row: under the header row that follows skiprows
+            first_row = options.get('skiprows', 0) + 2
+            result[table], reports[table] = coerce(result[table], options['schema'], first_row, table)
+    return result, reports
+
+
+def shared_root(path, cache_dir=CACHE_DIR):
+    # One directory per workbook so snapshots of different workbooks don't evict
+    # each other; the path hash tells apart workbooks with the same file name
+    name = os.path.splitext(os.path.basename(path))[0]
+    name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+    digest = hashlib.sha256(os.path.abspath(path).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, 'shared', f'{name}-{digest}')
+
+
+def load_tables(path, cache_dir=CACHE_DIR, use_cache=True):
+    """
+    Load all tracker tables, from the shared snapshot when the workbook is unchanged.
+
+    The first process to see a workbook version parses it and publishes the
+    tables (see shared.py); every process then maps the published columns,
+    so the data is parsed once and its memory is shared between workers.
+
+    Returns (tables, info) where info holds the workbook hash, where the data
+    came from ('shared' or 'workbook'), the timings of each step in seconds
+    and the coercion reports of the typed tables (see schema.py).
+    """
+    t0 = time.perf_counter()
+    timings = {}
+    digest = file_hash(path)
+    timings['hash'] = time.perf_counter() - t0
+
+    root = shared_root(path, cache_dir) if (use_cache and cache_dir) else None
+    tables = None
+    reports = {}
+    source = 'workbook'
+
+    if root and shared.exists(root, digest):
+        t = time.perf_counter()
+        try:
+            tables, extra = shared.attach(root, digest)
+            reports = extra.get('coercion', {})
+            source = 'shared'
+        except Exception as e:
+            logger.warning('Ignoring unreadable snapshot for %s: %s', path, e)
+        timings['attach'] = time.perf_counter() - t
+
+    if tables is None:
+        t = time.perf_counter()
+        tables, reports = parse_workbook(path)
+        tables['devices'] = build_device_rows(tables['list_df'], build_vessel_owner(tables['list_df']))
+        timings['parse'] = time.perf_counter() - t
+        if root:
+            t = time.perf_counter()
+            try:
+                shared.publish(tables, root, digest, extra={'coercion': reports})
+                tables, _ = shared.attach(root, digest)
+            except OSError as e:
+                logger.warning('Could not publish snapshot for %s: %s', path, e)
+            timings['publish'] = time.perf_counter() - t
+
+    timings['total'] = time.perf_counter() - t0
+    info = {'path': path, 'hash': digest, 'mtime': os.path.getmtime(path), 'source': source, 'timings': timings, 'coercion': reports}
+    logger.info('Loaded %s from %s in %.3fs (%s)', os.path.basename(path), source, timings['total'],
+                ', '.join(f'{k}={v:.3f}s' for k, v in timings.items() if k != 'total'))
+    return tables, info
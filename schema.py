@@ -0,0 +1,122 @@
+"""
+Declarative layout of the Tracker table and typed loading of its rows.
+
+TRACKER_SCHEMA lists the columns of list_df (B:J under the header on row 8)
+with the header text expected in the sheet and how each one is stored:
+
+- 'category': repetitive text (vessel, spec, device, status) as a pandas
+  categorical, one small integer code per row plus each distinct value once,
+  which the shared snapshot maps instead of decoding (see shared.py)
+- 'float': numbers (N and the savings columns)
+- 'date': installation dates, real dates or day-first text
+  (see indexes.parse_install_dates). They are checked but kept as the sheet
+  has them, as a categorical, so the tables show what was typed; the parsed
+  dates are the device rows' installed_at, used for filtering and aggregation
+- 'text': anything else, kept as Python objects
+
+The table runs to its last row with a value in any of its columns instead
+of a fixed row count, so rows appended to the sheet are picked up. Cells
+that had a value but could not be converted become missing and are listed
+in the coercion report kept with the snapshot (see /admin/stats).
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from indexes import parse_install_dates
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('text', 'category', 'float', 'date')
+
+# Failed cells listed in a report; the count covers all of them
+MAX_REPORTED = 200
+
+
+class Column:
+    def __init__(self, name, kind):
+        if kind not in KINDS:
+            raise ValueError(f'Unknown column kind {kind!r}')
+        self.name = name
+        self.kind = kind
+
+    def __repr__(self):
+        return f'Column({self.name!r}, {self.kind!r})'
+
+
+TRACKER_SCHEMA = (
+    Column('N', 'float'),
+    Column('Vessel Name/ ID', 'category'),
+    Column('Spec', 'category'),
+    Column('Devices', 'category'),
+    Column('Installation Status', 'category'),
+    Column('Date of Installation', 'date'),
+    Column('Scope 1 Expected Savings/year', 'float'),
+    Column('Scope 3 Expected Savings/year', 'float'),
+    Column('Co2 savings ton/year', 'float'),
+)
+
+
+def _is_blank(values):
+    # read_excel leaves empty cells as NaN; whitespace-only text counts as empty too
+    return values.isna().to_numpy() | values.map(lambda v: isinstance(v, str) and not v.strip()).to_numpy(dtype=bool)
+
+
+def _convert(values, kind):
+    if kind == 'category':
+        return values.where(~_is_blank(values)).astype('category')
+    if kind == 'float':
+        return pd.Series(pd.to_numeric(values.where(~_is_blank(values)), errors='coerce'), index=values.index, dtype='float64')
+    if kind == 'date':
+        return pd.Series(parse_install_dates(values.where(~_is_blank(values)).to_numpy()), index=values.index)
+    return values.where(~_is_blank(values), np.nan).astype(object)
+
+
+def empty_frame(schema):
+    dtypes = {'text': object, 'category': 'category', 'float': 'float64', 'date': 'category'}
+    return pd.DataFrame({column.name: pd.Series(dtype=dtypes[column.kind]) for column in schema})
+
+
+def coerce(frame, schema, first_row=1, table='table'):
+    """
+    Typed copy of a table read with read_excel semantics, and a report of the
+    cells that could not be converted.
+
+    Columns are matched by position and renamed to the schema's names (a
+    differing header in the sheet is logged), and trailing rows without any
+    value are dropped. first_row is the sheet row of the table's first row,
+    for the report: {'rows', 'failed', 'cells': [{'row', 'column', 'value'}]}.
+    """
+    if frame.shape[1] < len(schema):
+        if not frame.empty:
+            logger.warning('%s has %d columns, expected %d; loading it empty', table, frame.shape[1], len(schema))
+        return empty_frame(schema), {'rows': 0, 'failed': 0, 'cells': []}
+    frame = frame.iloc[:, :len(schema)]
+    for column, header in zip(schema, frame.columns):
+        if str(header).strip() != column.name:
+            logger.warning('%s: expected column %r, the sheet has %r', table, column.name, header)
+
+    blank = np.column_stack([_is_blank(frame.iloc[:, i]) for i in range(len(schema))]) if len(frame) else np.ones((0, 1), dtype=bool)
+    filled = np.flatnonzero(~blank.all(axis=1))
+    frame = frame.iloc[:filled[-1] + 1 if len(filled) else 0]
+    blank = blank[:len(frame)]
+
+    data = {}
+    cells = []
+    failed = 0
+    for i, column in enumerate(schema):
+        raw = frame.iloc[:, i]
+        values = _convert(raw, column.kind)
+        bad = np.flatnonzero(values.isna().to_numpy() & ~blank[:, i])
+        failed += len(bad)
+        for pos in bad[:max(0, MAX_REPORTED - len(cells))]:
+            cells.append({'row': first_row + int(pos), 'column': column.name, 'value': str(raw.iat[pos])})
+        if column.kind == 'date':
+            values = _convert(raw, 'category')
+        data[column.name] = values.array if isinstance(values.dtype, pd.CategoricalDtype) else values.to_numpy()
+    typed = pd.DataFrame(data, index=pd.RangeIndex(len(frame)))
+    if failed:
+        logger.warning('%s: %d cells could not be converted, e.g. %s', table, failed, cells[:3])
+    return typed, {'rows': len(typed), 'failed': failed, 'cells': cells}
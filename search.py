@@ -0,0 +1,154 @@
+"""
+Typeahead search over vessel names, device names and vessel specs.
+
+SearchIndex is built once per data version (DataSnapshot.search_index). Every
+name is normalised (case, accents, punctuation) and split into words. A
+sorted word list answers prefix queries with two bisects, and a trigram
+index narrows the candidates for typo-tolerant matching, which is checked
+with a bounded Damerau-Levenshtein distance. A query matches an entry when
+each of its words matches one of the entry's words (for vessels, including
+the words of their spec). Whole-name matches rank
+above word-prefix matches, which rank above fuzzy ones.
+"""
+
+import bisect
+import re
+import unicodedata
+
+KINDS = ('vessel', 'device', 'spec')
+
+# Scores; ties are broken by kind (in KINDS order) then by name
+EXACT = 100
+NAME_PREFIX = 90
+WORD_PREFIX = 80
+FUZZY = 60
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.findall(r'[a-z0-9]+', text.lower()))
+
+
+def _trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _natural(text):
+    # 'Britoil 21' before 'Britoil 120'
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', text.lower())]
+
+
+def max_typos(word):
+    return 0 if len(word) < 4 else 1 if len(word) < 8 else 2
+
+
+def edit_distance(a, b, limit):
+    """Damerau-Levenshtein distance of a and b, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = ca != cb
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SearchIndex:
+    def __init__(self, entries):
+        """entries: iterable of dicts with at least 'kind' and 'name'."""
+        self.entries = []
+        words = {}
+        for entry in entries:
+            key = normalize(entry['name'])
+            if not key:
+                continue
+            entry_id = len(self.entries)
+            self.entries.append((key, entry))
+            # A vessel is also found by the words of its spec
+            for word in set(key.split()) | set(normalize(entry.get('spec') or '').split()):
+                words.setdefault(word, []).append(entry_id)
+        self._words = sorted(words)
+        self._postings = [words[word] for word in self._words]
+        self._trigrams = {}
+        for n, word in enumerate(self._words):
+            for gram in _trigrams(word):
+                self._trigrams.setdefault(gram, []).append(n)
+
+    @classmethod
+    def from_snapshot(cls, snap):
+        devices = snap.devices
+        entries = []
+        vessel_specs = devices.dropna(subset=['spec']).groupby('vessel', sort=False, observed=True)['spec'].first()
+        for vessel in devices['vessel'].dropna().unique():
+            spec = vessel_specs.get(vessel)
+            entries.append({'kind': 'vessel', 'name': str(vessel), 'spec': None if spec is None else str(spec)})
+        device_names = list(devices['device'].dropna().unique())
+        if not snap.listdevice_df.empty:
+            device_names += list(snap.listdevice_df.iloc[:, 0].dropna())
+        for device in dict.fromkeys(str(name) for name in device_names):
+            entries.append({'kind': 'device', 'name': device})
+        vessel_counts = devices.dropna(subset=['spec']).groupby('spec', sort=False, observed=True)['vessel'].nunique()
+        for spec, count in vessel_counts.items():
+            entries.append({'kind': 'spec', 'name': str(spec), 'vessels': int(count)})
+        return cls(entries)
+
+    def _word_matches(self, query_word):
+        """{entry id: score} of entries with a word matching query_word."""
+        matches = {}
+        # Prefix: the words in [query_word, query_word + '￿') of the sorted list
+        lo = bisect.bisect_left(self._words, query_word)
+        hi = bisect.bisect_left(self._words, query_word + '￿', lo)
+        for n in range(lo, hi):
+            for entry_id in self._postings[n]:
+                matches[entry_id] = WORD_PREFIX
+        limit = max_typos(query_word)
+        if limit:
+            candidates = set()
+            for gram in _trigrams(query_word):
+                candidates.update(self._trigrams.get(gram, ()))
+            for n in candidates:
+                word = self._words[n]
+                # Compare against the word's start too, for half-typed words
+                distance = min(edit_distance(query_word, word, limit), edit_distance(query_word, word[:len(query_word)], limit))
+                if distance <= limit:
+                    score = FUZZY - 10 * distance
+                    for entry_id in self._postings[n]:
+                        if matches.get(entry_id, 0) < score:
+                            matches[entry_id] = score
+        return matches
+
+    def search(self, query, kinds=None):
+        """Ranked list of (score, entry) for query, optionally limited to some kinds."""
+        query = normalize(query)
+        if not query:
+            return []
+        scores = None
+        for query_word in query.split():
+            matches = self._word_matches(query_word)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {entry_id: min(score, matches[entry_id]) for entry_id, score in scores.items() if entry_id in matches}
+            if not scores:
+                return []
+        results = []
+        for entry_id, score in scores.items():
+            key, entry = self.entries[entry_id]
+            if kinds and entry['kind'] not in kinds:
+                continue
+            if key == query:
+                score = EXACT
+            elif key.startswith(query):
+                score = NAME_PREFIX
+            results.append((score, entry))
+        results.sort(key=lambda item: (-item[0], KINDS.index(item[1]['kind']), _natural(item[1]['name'])))
+        return results
@@ -0,0 +1,158 @@
+"""
+Columnar on-disk snapshot of the tracker tables, shared by all workers.
+
+publish() writes every table as one .npy file per column into a directory
+named after the workbook hash. attach() maps those files read-only with
+np.load(mmap_mode='r') and wraps them in DataFrames without copying, so
+every gunicorn worker attached to the same version reads the same pages
+from the OS page cache instead of holding its own copy.
+
+How each column is stored:
+- numeric, boolean and datetime columns: the values array itself (zero-copy)
+- categorical columns: the codes array (zero-copy) plus the categories
+- object columns: dictionary codes plus the distinct values. Mixed
+  text/number columns can't be shared as Python objects, so these are
+  rebuilt per worker from the (shared) codes; the tracker's text columns are
+  typed as categoricals to avoid that (see schema.py)
+- integer row indexes (the device rows keep list_df positions): an array too
+
+A directory is built under a temporary name and renamed into place, so
+attach() only ever sees complete snapshots. Publishing a new version
+removes older ones; workers still mapping them keep their open files.
+"""
+
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Part of the snapshot directory name; bump it when the layout or the typing
+# of the tables changes so snapshots written by older code are not attached
+FORMAT = 5
+
+
+def _is_missing(value):
+    return value is None or value is pd.NaT or (isinstance(value, float) and value != value)
+
+
+def _encode_objects(values):
+    # Like factorize, but 1, 1.0 and True stay distinct values
+    lookup = {}
+    categories = []
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if _is_missing(value):
+            codes[i] = -1
+            continue
+        key = (type(value), value)
+        code = lookup.get(key)
+        if code is None:
+            code = lookup[key] = len(categories)
+            categories.append(value)
+        codes[i] = code
+    return codes, categories
+
+
+def _decode_objects(codes, categories):
+    values = np.empty(len(codes), dtype=object)
+    values[:] = np.nan
+    present = codes >= 0
+    if categories:
+        lookup = np.empty(len(categories), dtype=object)
+        lookup[:] = categories
+        values[present] = lookup[codes[present]]
+    return values
+
+
+def _write_table(frame, directory, name):
+    columns = []
+    for i, (label, series) in enumerate(frame.items()):
+        file_name = f'{name}.{i}.npy'
+        dtype = series.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            np.save(os.path.join(directory, file_name), series.cat.codes.to_numpy())
+            columns.append((label, 'category', file_name, (list(dtype.categories), dtype.ordered)))
+        elif dtype.kind in 'biufM' and not isinstance(dtype, pd.api.extensions.ExtensionDtype):
+            np.save(os.path.join(directory, file_name), series.to_numpy())
+            columns.append((label, 'array', file_name, None))
+        else:
+            codes, categories = _encode_objects(series.to_numpy(dtype=object))
+            np.save(os.path.join(directory, file_name), codes)
+            columns.append((label, 'object', file_name, categories))
+    index = frame.index
+    if isinstance(index, pd.RangeIndex):
+        index = ('range', index.start, index.stop, index.step)
+    elif index.dtype.kind in 'iu':
+        np.save(os.path.join(directory, f'{name}.index.npy'), index.to_numpy())
+        index = ('array', f'{name}.index.npy')
+    return {'columns': columns, 'index': index}
+
+
+def _read_table(meta, directory):
+    data = {}
+    for i, (label, kind, file_name, extra) in enumerate(meta['columns']):
+        values = np.load(os.path.join(directory, file_name), mmap_mode='r').view(np.ndarray)
+        if kind == 'category':
+            categories, ordered = extra
+            values = pd.Categorical.from_codes(values, dtype=pd.CategoricalDtype(categories, ordered), validate=False)
+        elif kind == 'object':
+            values = _decode_objects(values, extra)
+        data[i] = values
+    index = meta['index']
+    if isinstance(index, tuple) and index and index[0] == 'range':
+        index = pd.RangeIndex(*index[1:])
+    elif isinstance(index, tuple) and index and index[0] == 'array':
+        index = pd.Index(np.load(os.path.join(directory, index[1]), mmap_mode='r').view(np.ndarray), copy=False)
+    if not data:
+        return pd.DataFrame(index=index)
+    frame = pd.DataFrame(data, index=index, copy=False)
+    # Keyed by position above since column labels may repeat
+    frame.columns = pd.Index([label for label, *_ in meta['columns']], dtype=object)
+    return frame
+
+
+def snapshot_dir(root, digest):
+    return os.path.join(root, f'tracker-{digest[:32]}-c{FORMAT}')
+
+
+def exists(root, digest):
+    return os.path.exists(os.path.join(snapshot_dir(root, digest), 'meta.pkl'))
+
+
+def publish(tables, root, digest, extra=None):
+    """Write tables to the snapshot directory for digest (no-op if it already exists)."""
+    final = snapshot_dir(root, digest)
+    if exists(root, digest):
+        return final
+    os.makedirs(root, exist_ok=True)
+    tmp = f'{final}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    meta = {'tables': {name: _write_table(frame, tmp, name) for name, frame in tables.items()}, 'extra': extra or {}}
+    with open(os.path.join(tmp, 'meta.pkl'), 'wb') as f:
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+    try:
+        os.rename(tmp, final)
+    except OSError:
+        # Another worker published the same version first
+        shutil.rmtree(tmp, ignore_errors=True)
+    _remove_older(root, final)
+    return final
+
+
+def _remove_older(root, keep):
+    for entry in os.listdir(root):
+        path = os.path.join(root, entry)
+        if path != keep and entry.startswith('tracker-') and os.path.isdir(path) and not entry.endswith('.tmp'):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def attach(root, digest):
+    """Map the published tables for digest. Returns (tables, extra)."""
+    directory = snapshot_dir(root, digest)
+    with open(os.path.join(directory, 'meta.pkl'), 'rb') as f:
+        meta = pickle.load(f)
+    tables = {name: _read_table(table_meta, directory) for name, table_meta in meta['tables'].items()}
+    return tables, meta['extra']
@@ -0,0 +1,200 @@
+"""
+Versioned data snapshots with live reload.
+
+A DataSnapshot bundles every table loaded from the tracker workbook together
+with the indexes derived from them. The device rows come with the tables
+(see loader.load_tables) and are only rebuilt when they are missing. Snapshots are never modified once built:
+a reload builds a complete new one in the background and swaps it in with a
+single reference assignment, so a request that grabbed the current snapshot
+keeps a consistent view even if a reload finishes halfway through it.
+
+Every gunicorn worker owns its own SnapshotStore. The store polls the
+workbook's mtime/size from a daemon thread and reloads when the content hash
+changes; reload() can also be triggered explicitly (see /admin/reload).
+close() stops the polling once the store is dropped (see datasets.py).
+"""
+
+import functools
+import itertools
+import logging
+import os
+import threading
+import time
+
+from aggregates import FleetAggregates
+from indexes import build_device_index, build_device_rows, build_vessel_index, build_vessel_owner
+from loader import file_hash, load_tables
+from search import SearchIndex
+from timeline import SavingsTimeline
+
+logger = logging.getLogger(__name__)
+
+RELOAD_INTERVAL = float(os.environ.get('SUSTAINABOS_RELOAD_INTERVAL', '30'))
+
+_versions = itertools.count(1)
+
+
+class DataSnapshot:
+    """
+    All tables of one workbook load plus their derived indexes. Read-only.
+
+    `source_hash` is the hash of the workbook file the tables came from and
+    `hash` identifies the content served (it differs from source_hash once
+    edits not yet written back are layered on top, see journal.py).
+    """
+
+    def __init__(self, tables, info, content_hash=None, edit_id=0, vessel_index=None, vessel_owner=None, device_index=None):
+        self.version = next(_versions)
+        self.source_hash = info['hash']
+        self.hash = content_hash or info['hash']
+        self.edit_id = edit_id
+        self.info = info
+        self.loaded_at = time.time()
+
+        self.tables = tables
+
+        self.list_df = tables['list_df']
+        self.summary_df = tables['summary_df']
+        self.summary2_df = tables['summary2_df']
+        self.summary3_df = tables['summary3_df']
+        self.listvessel_df = tables['listvessel_df']
+        self.listdevice_df = tables['listdevice_df']
+
+        # Status edits pass the indexes they leave unchanged or have updated (see journal.apply_edits)
+        self.vessel_index = build_vessel_index(self.list_df) if vessel_index is None else vessel_index
+        self.vessel_owner = build_vessel_owner(self.list_df) if vessel_owner is None else vessel_owner
+        self.device_index = build_device_index(self.list_df) if device_index is None else device_index
+        devices = tables.get('devices')
+        self.devices = devices if devices is not None else build_device_rows(self.list_df, self.vessel_owner)
+
+    @functools.cached_property
+    def aggregates(self):
+        # Built on first use so reloads that nobody queries stay cheap
+        return FleetAggregates(self.devices)
+
+    @functools.cached_property
+    def search_index(self):
+        return SearchIndex.from_snapshot(self)
+
+    @functools.cached_property
+    def timeline(self):
+        # Status edits carry it over from the snapshot they edit (see journal.apply_edits)
+        return SavingsTimeline(self.devices)
+
+    def __repr__(self):
+        return f'<DataSnapshot v{self.version} {self.hash[:12]}>'
+
+
+class SnapshotStore:
+    """Holds the current DataSnapshot for a workbook and swaps in reloaded ones."""
+
+    def __init__(self, path, interval=RELOAD_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._snapshot = None
+        self._stamp = None
+        self._reload_lock = threading.Lock()
+        self._watcher_pid = None
+        self._watcher_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._listeners = []
+        self._overlays = []
+
+    def add_overlay(self, overlay):
+        """Pass every freshly loaded snapshot through overlay(snapshot) -> snapshot before it is swapped in."""
+        self._overlays.append(overlay)
+        return overlay
+
+    def on_load(self, callback):
+        """Call callback(snapshot) after every swap, in the thread that did the reload."""
+        self._listeners.append(callback)
+        return callback
+
+    def current(self):
+        """The snapshot to use for the rest of a request. Grab it once and keep it."""
+        if self._snapshot is None:
+            self.reload(force=True)
+        return self._snapshot
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def reload(self, force=False):
+        """
+        Rebuild the snapshot if the workbook changed (or always with force=True).
+
+        Returns True when a new snapshot was swapped in. On failure the previous
+        snapshot stays in place and the next poll tries again.
+        """
+        with self._reload_lock:
+            try:
+                stamp = self._file_stamp()
+                if not force and stamp == self._stamp:
+                    return False
+                if not force and self._snapshot is not None and file_hash(self.path) == self._snapshot.source_hash:
+                    # Touched but not changed
+                    self._stamp = stamp
+                    return False
+                tables, info = load_tables(self.path)
+                snapshot = DataSnapshot(tables, info)
+                for overlay in self._overlays:
+                    snapshot = overlay(snapshot)
+            except Exception:
+                if self._snapshot is None:
+                    raise
+                logger.exception('Reloading %s failed, keeping %r', self.path, self._snapshot)
+                return False
+            self._snapshot = snapshot
+            self._stamp = stamp
+            logger.info('Swapped in %r', snapshot)
+        self._notify(snapshot)
+        return True
+
+    def update(self, change):
+        """
+        Swap in change(current snapshot) -> new snapshot, serialised with reloads.
+        change may return the same snapshot to leave things as they are.
+        """
+        self.current()
+        with self._reload_lock:
+            snapshot = change(self._snapshot)
+            if snapshot is self._snapshot:
+                return snapshot
+            self._snapshot = snapshot
+        self._notify(snapshot)
+        return snapshot
+
+    def _notify(self, snapshot):
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception:
+                logger.exception('Snapshot listener %r failed', callback)
+
+    def reload_async(self, force=False):
+        """Reload in a background thread without blocking the caller."""
+        thread = threading.Thread(target=self.reload, kwargs={'force': force}, name='snapshot-reload', daemon=True)
+        thread.start()
+        return thread
+
+    def ensure_watcher(self):
+        """Start the polling thread in this process if it isn't running yet (safe to call per request)."""
+        if self.interval <= 0 or self._watcher_pid == os.getpid() or self._closed.is_set():
+            return
+        with self._watcher_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+            threading.Thread(target=self._watch, name='snapshot-watcher', daemon=True).start()
+
+    def close(self):
+        """Stop polling the workbook. The current snapshot stays usable for whoever holds it."""
+        self._closed.set()
+
+    def _watch(self):
+        while not self._closed.wait(self.interval):
+            try:
+                self.reload()
+            except Exception:
+                logger.exception('Snapshot watcher error')
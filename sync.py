@@ -0,0 +1,138 @@
+"""
+Versioned JSON copy of the Tracker sheet for offline clients.
+
+The service worker keeps the tracker rows in IndexedDB so vessel and device
+lookups work on board without a connection. A client that already holds a
+version only downloads the rows that changed since then.
+
+Versions are the first 16 hex digits of the snapshot hash, identical in
+every worker. Each version's rows are written to .cache/sync/<version>.json
+so any worker can compute a delta from any of the last KEEP_VERSIONS
+versions; older clients get the whole tracker again.
+"""
+
+import datetime
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from loader import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+SYNC_DIR = os.path.join(CACHE_DIR, 'sync')
+KEEP_VERSIONS = int(os.environ.get('SUSTAINABOS_SYNC_VERSIONS', '32'))
+
+_VERSION_RE = re.compile(r'^[0-9a-f]{16}$')
+
+
+def data_version(snap):
+    return snap.hash[:16]
+
+
+def _cell(value):
+    # JSON value of a list_df cell; dates as str() of them, as the HTML fragments show them
+    if value is None or value is pd.NaT or (isinstance(value, float) and value != value):
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        # Whole numbers as the sheet holds them (N, savings) rather than 1.0
+        return int(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return str(value)
+    return value
+
+
+def tracker_rows(list_df):
+    return [[_cell(value) for value in row] for row in list_df.itertuples(index=False, name=None)]
+
+
+class TrackerSync:
+    def __init__(self, columns, device_columns, directory=SYNC_DIR, keep=KEEP_VERSIONS):
+        self.columns = list(columns)
+        self.device_columns = list(device_columns)
+        self.directory = directory
+        self.keep = keep
+        self._current = None  # (version, payload)
+        self._lock = threading.Lock()
+
+    def payload(self, snap):
+        """Whole tracker for a snapshot: {'version', 'columns', 'device_columns', 'rows', 'vessels'}."""
+        version = data_version(snap)
+        current = self._current
+        if current is not None and current[0] == version:
+            return current[1]
+        with self._lock:
+            current = self._current
+            if current is None or current[0] != version:
+                payload = {
+                    'version': version,
+                    'columns': self.columns,
+                    'device_columns': self.device_columns,
+                    'rows': tracker_rows(snap.list_df),
+                    'vessels': {name: [start, end] for name, (start, end) in snap.vessel_index.items()},
+                }
+                self._save(version, payload)
+                current = self._current = (version, payload)
+        return current[1]
+
+    def delta(self, snap, since=None):
+        """
+        Changes from version `since` to snap, or the whole tracker if since is
+        unknown. A delta has 'base', 'length' (new row count) and 'rows'
+        ({position: row} for changed rows only); 'vessels' is included when
+        anything changed.
+        """
+        payload = self.payload(snap)
+        if since == payload['version']:
+            return {'version': since, 'base': since, 'length': len(payload['rows']), 'rows': {}}
+        base = self._load(since) if since else None
+        if base is None:
+            return dict(payload, full=True)
+        old_rows = base['rows']
+        rows = {i: row for i, row in enumerate(payload['rows']) if i >= len(old_rows) or old_rows[i] != row}
+        delta = {'version': payload['version'], 'base': since, 'length': len(payload['rows']), 'rows': rows}
+        if rows or len(old_rows) != len(payload['rows']):
+            delta['vessels'] = payload['vessels']
+        return delta
+
+    def _path(self, version):
+        return os.path.join(self.directory, f'{version}.json')
+
+    def _save(self, version, payload):
+        path = self._path(version)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, separators=(',', ':'))
+            os.replace(tmp, path)
+            self._prune()
+        except OSError:
+            logger.exception('Could not save tracker version %s', version)
+
+    def _prune(self):
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')]
+        files.sort(key=os.path.getmtime, reverse=True)
+        for path in files[self.keep:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _load(self, version):
+        if not _VERSION_RE.match(version or ''):
+            return None
+        try:
+            with open(self._path(version), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
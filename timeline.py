@@ -0,0 +1,226 @@
+"""
+Cumulative realised savings over time, from each device's installation date.
+
+A device row starts saving on its Date of Installation once its status is
+Done: from that day on it adds 1/365.25 of its yearly fuel and maintenance
+savings and CO2 tons every day. Rows not Done or without a date save nothing.
+
+A series (the fleet, one vessel or one device) is kept sparse, as the days on
+which devices started saving and the daily savings they added that day.
+With prefix sums over those days, R (daily rate) and S (rate weighted by
+start day), the savings accumulated by the end of day t are
+
+    cumulative(t) = R(t) * t - S(t)
+
+where R and S are summed over the start days up to t. Any window, daily or
+monthly, is then read with one searchsorted, whatever its length.
+
+The series of every vessel and every device are built together, in one
+groupby over the device rows, the first time a dimension is asked for. When
+status edits change a few rows, updated() moves those rows' contributions in
+the fleet series and in the series of their vessel and device only. The
+other series are shared with the previous timeline.
+"""
+
+import datetime
+import functools
+
+import numpy as np
+import pandas as pd
+
+from aggregates import DONE
+
+DIMENSIONS = ('fleet', 'vessel', 'device')
+MEASURES = ('fuel_savings', 'maintenance_savings', 'co2_savings')
+FREQUENCIES = ('day', 'month')
+
+DAYS_PER_YEAR = 365.25
+# Points per series in one response
+MAX_POINTS = 20000
+
+
+class TimelineError(ValueError):
+    pass
+
+
+def _day(value):
+    # Days since 1970-01-01, the unit of every series
+    return int(np.datetime64(value, 'D').astype('int64'))
+
+
+def _date(day):
+    return np.datetime64(int(day), 'D').astype(datetime.date)
+
+
+def contributions(devices):
+    """(start day per row, daily savings per row and measure); rows that don't save get day -1 and zeros."""
+    installed = devices['installed_at']
+    counted = (devices['status'] == DONE).to_numpy() & installed.notna().to_numpy()
+    days = np.full(len(devices), -1, dtype='int64')
+    days[counted] = installed.to_numpy()[counted].astype('datetime64[D]').astype('int64')
+    rates = np.column_stack([devices[measure].fillna(0).to_numpy(dtype='float64') for measure in MEASURES]) / DAYS_PER_YEAR
+    rates[~counted] = 0.0
+    return days, rates.reshape(len(devices), len(MEASURES))
+
+
+class Series:
+    """Start days (sorted, unique) and the daily savings added on each. Never modified."""
+
+    __slots__ = ('days', 'rates', '_rate', '_offset')
+
+    def __init__(self, days, rates):
+        self.days = days
+        self.rates = rates
+        self._rate = np.cumsum(rates, axis=0)
+        self._offset = np.cumsum(rates * (days - 1)[:, None], axis=0)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype='int64'), np.empty((0, len(MEASURES))))
+
+    def at(self, days):
+        """Cumulative savings at the end of each day, shape (len(days), len(MEASURES))."""
+        k = np.searchsorted(self.days, days, side='right') - 1
+        started = k >= 0
+        values = np.zeros((len(days), len(MEASURES)))
+        if started.any():
+            k = k[started]
+            values[started] = self._rate[k] * days[started, None] - self._offset[k]
+        return values
+
+    def moved(self, changes):
+        """New Series with (day, daily savings) changes added; negative savings take a contribution out."""
+        days = np.concatenate([self.days, [day for day, _ in changes]])
+        rates = np.concatenate([self.rates, [rates for _, rates in changes]])
+        return _grouped(days, rates)
+
+    def first_day(self):
+        started = np.flatnonzero((self.rates != 0).any(axis=1))
+        return int(self.days[started[0]]) if len(started) else None
+
+
+def _grouped(days, rates):
+    # One entry per start day, dropping days whose contributions cancelled out
+    unique, inverse = np.unique(days, return_inverse=True)
+    summed = np.zeros((len(unique), len(MEASURES)))
+    np.add.at(summed, inverse, rates)
+    keep = np.abs(summed).max(axis=1) > 1e-12 if len(unique) else np.zeros(0, dtype=bool)
+    return Series(unique[keep], summed[keep])
+
+
+def _series_by(keys, days, rates):
+    """{key: Series} for every key, from the contributing rows in one groupby."""
+    counted = days >= 0
+    frame = pd.DataFrame(rates[counted], columns=list(MEASURES))
+    frame['key'] = np.asarray(keys, dtype=object)[counted]
+    frame['day'] = days[counted]
+    grouped = frame.groupby(['key', 'day'], sort=True)[list(MEASURES)].sum()
+    if grouped.empty:
+        return {}
+    keys = grouped.index.get_level_values('key')
+    day_values = grouped.index.get_level_values('day').to_numpy(dtype='int64')
+    values = grouped.to_numpy()
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    return {keys[start]: Series(day_values[start:end], values[start:end]) for start, end in zip(starts, ends)}
+
+
+def sample_days(start, end, freq):
+    """(label, day) pairs of a window: every day, or the end of every month (the window's end for the last one)."""
+    if freq == 'day':
+        days = np.arange(start, end + 1, dtype='int64')
+        labels = [str(np.datetime64(int(d), 'D')) for d in days]
+        return labels, days
+    months = np.arange(np.datetime64(int(start), 'D').astype('datetime64[M]'), np.datetime64(int(end), 'D').astype('datetime64[M]') + 1)
+    days = np.minimum((months + 1).astype('datetime64[D]').astype('int64') - 1, end)
+    return [str(m) for m in months], days
+
+
+class SavingsTimeline:
+    def __init__(self, devices, fleet=None, series=None):
+        self.devices = devices
+        self._fleet = fleet
+        self._series = dict(series or {})  # dimension -> {name: Series}
+
+    @functools.cached_property
+    def _contributions(self):
+        return contributions(self.devices)
+
+    @property
+    def fleet(self):
+        if self._fleet is None:
+            days, rates = self._contributions
+            counted = days >= 0
+            self._fleet = _grouped(days[counted], rates[counted])
+        return self._fleet
+
+    def series(self, dimension, name=None):
+        """The Series of the fleet, or of one vessel or device (empty when it has none)."""
+        if dimension == 'fleet':
+            return self.fleet
+        if dimension not in DIMENSIONS:
+            raise KeyError(dimension)
+        by_name = self._series.get(dimension)
+        if by_name is None:
+            days, rates = self._contributions
+            by_name = self._series[dimension] = _series_by(self.devices[dimension].to_numpy(dtype=object), days, rates)
+        return by_name.get(name) or Series.empty()
+
+    def window(self, dimension, names=(None,), start=None, end=None, freq='month'):
+        """
+        {'start', 'end', 'freq', 'dates', 'series': [{'name', measure: [...], 'total_savings': [...]}]}
+        for the window [start, end] (dates), by default from the first saving day to today.
+        """
+        if freq not in FREQUENCIES:
+            raise TimelineError('freq must be one of: ' + ', '.join(FREQUENCIES))
+        series = [(name, self.series(dimension, name)) for name in names]
+        end = _day(end or datetime.date.today())
+        if start is None:
+            first = [day for day in (s.first_day() for _, s in series) if day is not None]
+            start = min(first + [end])
+        else:
+            start = _day(start)
+        if start > end:
+            raise TimelineError('start must not be after end')
+        if freq == 'day' and end - start + 1 > MAX_POINTS:
+            raise TimelineError(f'At most {MAX_POINTS} days per request; use freq=month for longer windows')
+        labels, days = sample_days(start, end, freq)
+        result = []
+        for name, s in series:
+            values = s.at(days)
+            item = {'name': name} if dimension != 'fleet' else {}
+            for i, measure in enumerate(MEASURES):
+                item[measure] = np.round(values[:, i], 2).tolist()
+            item['total_savings'] = np.round(values[:, 0] + values[:, 1], 2).tolist()
+            result.append(item)
+        return {'start': str(_date(start)), 'end': str(_date(end)), 'freq': freq, 'dates': labels, 'series': result}
+
+    def updated(self, devices, positions):
+        """
+        Timeline of devices, the device rows of a snapshot that differs from
+        this one's only in the list_df rows at positions (status edits). Only
+        those rows are looked at: their old contribution is taken out of the
+        series it was in and the new one added, the rest is shared.
+        """
+        moves = []
+        for pos in dict.fromkeys(positions):
+            for frame, sign in ((self.devices, -1), (devices, 1)):
+                if pos not in frame.index:
+                    continue
+                row = frame.loc[[pos]]
+                days, rates = contributions(row)
+                if days[0] >= 0:
+                    moves.append((row, int(days[0]), sign * rates[0]))
+        if not moves:
+            return SavingsTimeline(devices, self._fleet, self._series)
+        fleet = self.fleet.moved([(day, rates) for _, day, rates in moves])
+        series = {}
+        for dimension, by_name in self._series.items():
+            changes = {}
+            for row, day, rates in moves:
+                changes.setdefault(row[dimension].iat[0], []).append((day, rates))
+            by_name = dict(by_name)
+            for name, moved in changes.items():
+                by_name[name] = by_name.get(name, Series.empty()).moved(moved)
+            series[dimension] = by_name
+        return SavingsTimeline(devices, fleet, series)
@@ -0,0 +1,208 @@
+"""
+Write-behind of journalled status edits into the tracker workbook.
+
+Saving the workbook through openpyxl would throw away the cached results of
+every formula (the Summary sheet and the savings columns are all formulas),
+plus features openpyxl does not support. So only the edited cells are
+patched, directly in the sheet XML inside the xlsx, and every other part
+of the file is copied through untouched. The workbook is flagged to
+recalculate when Excel next opens it.
+
+Batches are written under an exclusive lock file so several gunicorn
+workers never write at the same time; whichever worker gets the lock
+flushes the pending edits of all of them.
+"""
+
+import contextlib
+import logging
+import os
+import re
+import threading
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+from journal import DATE_COLUMN, STATUS_COLUMN, locate_device_row
+from loader import TABLES, file_hash, load_tables
+from snapshot import DataSnapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: no cross-process locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.environ.get('SUSTAINABOS_FLUSH_INTERVAL', '60'))
+
+TRACKER_SHEET = 'Tracker'
+# list_df position 0 is the row right under its header row
+TRACKER_FIRST_ROW = TABLES['list_df'][1]['skiprows'] + 2
+
+
+class WritebackError(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def workbook_lock(path, blocking=True):
+    """Exclusive lock on <workbook>.lock. Yields False if blocking=False and it is taken."""
+    with open(f'{path}.lock', 'a') as lock_file:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _attrs(tag):
+    return dict(re.findall(r'([\w:]+)="([^"]*)"', tag))
+
+
+def _sheet_part(zf, sheet_name):
+    workbook = zf.read('xl/workbook.xml').decode('utf-8')
+    rel_id = None
+    for tag in re.findall(r'<sheet\b[^>]*>', workbook):
+        attrs = _attrs(tag)
+        if attrs.get('name') == escape(sheet_name, {'"': '&quot;'}):
+            rel_id = attrs.get('r:id')
+    if rel_id is None:
+        raise WritebackError(f'No sheet named {sheet_name!r}')
+    rels = zf.read('xl/_rels/workbook.xml.rels').decode('utf-8')
+    for tag in re.findall(r'<Relationship\b[^>]*>', rels):
+        attrs = _attrs(tag)
+        if attrs.get('Id') == rel_id:
+            target = attrs['Target']
+            return target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+    raise WritebackError(f'No part found for sheet {sheet_name!r}')
+
+
+def _column_number(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+def _set_cell(row_xml, ref, value):
+    cell = f'<c r="{ref}"%s t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+    m = re.search(r'<c\b[^>]*\br="%s"[^>]*?(?:/>|>.*?</c>)' % ref, row_xml, re.S)
+    if m:
+        style = _attrs(m.group(0)[:m.group(0).index('>') + 1]).get('s')
+        return row_xml[:m.start()] + cell % (f' s="{style}"' if style else '') + row_xml[m.end():]
+    # Keep cells in column order
+    column = _column_number(re.match(r'[A-Z]+', ref).group(0))
+    for other in re.finditer(r'<c\b[^>]*\br="([A-Z]+)\d+"', row_xml):
+        if _column_number(other.group(1)) > column:
+            return row_xml[:other.start()] + cell % '' + row_xml[other.start():]
+    return row_xml + cell % ''
+
+
+def _set_cells(sheet_xml, cells):
+    by_row = {}
+    for (row, column), value in cells.items():
+        by_row.setdefault(row, {})[column] = value
+    for row, values in sorted(by_row.items()):
+        m = re.search(r'<row\b[^>]*\br="%d"[^>]*?(/?)>' % row, sheet_xml)
+        if m is None:
+            raise WritebackError(f'Row {row} not found in sheet')
+        if m.group(1):
+            # <row .../> -> <row ...></row>
+            sheet_xml = sheet_xml[:m.start(1)] + '></row>' + sheet_xml[m.end():]
+            body_start = m.start(1) + 1
+        else:
+            body_start = m.end()
+        body_end = sheet_xml.index('</row>', body_start)
+        body = sheet_xml[body_start:body_end]
+        for column, value in values.items():
+            body = _set_cell(body, f'{column}{row}', value)
+        sheet_xml = sheet_xml[:body_start] + body + sheet_xml[body_end:]
+    return sheet_xml
+
+
+def patch_workbook(path, sheet_name, cells):
+    """Write {(row, column letter): text} into a sheet, leaving the rest of the file as is."""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with zipfile.ZipFile(path) as zin:
+        part = _sheet_part(zin, sheet_name)
+        with zipfile.ZipFile(tmp, 'w') as zout:
+            for item in zin.infolist():
+                data = zin.read(item.filename)
+                if item.filename == part:
+                    data = _set_cells(data.decode('utf-8'), cells).encode('utf-8')
+                elif item.filename == 'xl/workbook.xml':
+                    # Cached formula results are now stale: have Excel recalculate on open
+                    data = data.decode('utf-8')
+                    if 'fullCalcOnLoad' not in data:
+                        data = re.sub(r'<calcPr\b', '<calcPr fullCalcOnLoad="1"', data, count=1)
+                    data = data.encode('utf-8')
+                zout.writestr(item, data)
+    os.replace(tmp, path)
+
+
+def flush(journal, path, blocking=False):
+    """Write all pending journal edits into the workbook. Returns the number written."""
+    with workbook_lock(path, blocking=blocking) as locked:
+        if not locked:
+            return 0
+        pending = journal.pending()
+        if not pending:
+            return 0
+        tables, info = load_tables(path)
+        snap = DataSnapshot(tables, info)
+        cells = {}
+        for edit in pending:
+            pos = locate_device_row(snap, edit['vessel'], edit['device'])
+            if pos is None:
+                logger.warning('Dropping edit %s: %s / %s is not in the workbook', edit['id'], edit['vessel'], edit['device'])
+                continue
+            row = pos + TRACKER_FIRST_ROW
+            cells[(row, _column_letter(STATUS_COLUMN))] = edit['status']
+            if edit.get('installed'):
+                cells[(row, _column_letter(DATE_COLUMN))] = edit['installed']
+        if cells:
+            patch_workbook(path, TRACKER_SHEET, cells)
+        journal.record_flush(file_hash(path), pending[-1]['id'])
+        logger.info('Wrote %d status edits back to %s', len(pending), path)
+        return len(pending)
+
+
+def _column_letter(list_df_column):
+    # list_df starts at column B
+    from openpyxl.utils import get_column_letter
+    return get_column_letter(list_df_column + 2)
+
+
+class WriteBehind:
+    """Periodically flushes the journal into the workbook from a daemon thread."""
+
+    def __init__(self, journal, path, interval=FLUSH_INTERVAL):
+        self.journal = journal
+        self.path = path
+        self.interval = interval
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='status-writeback', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                flush(self.journal, self.path)
+            except Exception:
+                logger.exception('Writing status edits back failed')